@@ -0,0 +1,186 @@
+# Parser benchmark over the golden fixtures in fixtures/banner and
+# fixtures/kuali. Every backend runs in its own process so peak RSS is its
+# own, and its output is checked against the checked-in CSVs before timing.
+import argparse
+import csv
+import importlib.util
+import json
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows has no getrusage
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from scraper_common.banner import SECTION_FIELDS, SEAT_FIELDS, SECTION_PARSERS, SEAT_PARSERS
+from scraper_common.fixtures import load_banner_pages, load_kuali_courses
+
+def load_calendar_scraper():
+    spec = importlib.util.spec_from_file_location('scraper_calendar', os.path.join(ROOT, 'description', 'scraper-calendar.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def read_csv(*path):
+    with open(os.path.join(ROOT, *path), 'r', newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+def expected_rows(kind):
+    # Golden rows keyed the way parsed rows are matched against them
+    if kind == 'sections':
+        return {(row['term'], row['crn']): tuple(row[field] for field in SECTION_FIELDS)
+                for row in read_csv('scraped-data', 'scraped_course_data.csv')}
+    if kind == 'seats':
+        return {(row['term'], row['crn']): tuple(row[field] for field in SEAT_FIELDS)
+                for row in read_csv('seat-capacity', 'course_capacity_data.csv')}
+    return {row['Course ID']: tuple(row.values()) for row in read_csv('description', 'scraped_course_data.csv')}
+
+def load_corpus(kind):
+    # (parse arguments, content) pairs for one kind of page
+    if kind == 'calendar':
+        return [((course,), detail) for course, detail in load_kuali_courses()]
+    corpus = []
+    for page_kind, path, page_args in load_banner_pages():
+        if page_kind == kind:
+            with open(path, 'rb') as f:
+                corpus.append((page_args, f.read()))
+    return corpus
+
+def parser_for(kind, backend):
+    # Returns parse(content, *args) -> list of row tuples, and the row key
+    if kind == 'sections':
+        parse = SECTION_PARSERS[backend]
+        return (lambda content, *args: [tuple(row) for row in parse(content, *args)],
+                lambda row: (row[0], row[4]))
+    if kind == 'seats':
+        parse = SEAT_PARSERS[backend]
+
+        def parse_seats(content, *args):
+            row = parse(content, *args)
+            return [tuple(row[field] for field in SEAT_FIELDS)] if row else []
+        return parse_seats, lambda row: (row[0], row[1])
+    calendar = load_calendar_scraper()
+
+    def parse_course(content, course):
+        # What the CSV writer would store for this course
+        row = calendar.course_row(course, json.loads(content))
+        return [tuple(str(row[field]) for field in calendar.COURSE_FIELDS)]
+    return parse_course, lambda row: row[1]
+
+def peak_rss_kib():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+def run_backend(kind, backend, rounds):
+    # Runs in a fresh worker process
+    corpus = load_corpus(kind)
+    parse, key = parser_for(kind, backend)
+    expected = expected_rows(kind)
+
+    # Correctness pass, which also warms up caches and imports. Every
+    # fixture page was rendered from at least one row, so an empty result
+    # counts as a mismatch too.
+    mismatches = 0
+    rows = 0
+    for page_args, content in corpus:
+        parsed = parse(content, *page_args)
+        if not parsed:
+            mismatches += 1
+        for row in parsed:
+            rows += 1
+            if expected.get(key(row)) != row:
+                mismatches += 1
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    for _ in range(rounds):
+        for page_args, content in corpus:
+            parse(content, *page_args)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    # Allocation pass: peak Python heap growth while parsing one page
+    tracemalloc.start()
+    page_peaks = []
+    for page_args, content in corpus:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        parse(content, *page_args)
+        page_peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+
+    pages = len(corpus) * rounds
+    return {
+        'kind': kind,
+        'backend': backend,
+        'pages': len(corpus),
+        'rows': rows,
+        'mismatches': mismatches,
+        'seconds': elapsed,
+        'cpu_seconds': cpu,
+        'pages_per_sec': pages / elapsed,
+        'rows_per_sec': rows * rounds / elapsed,
+        'alloc_kib_per_page': sum(page_peaks) / len(page_peaks) / 1024 if page_peaks else 0,
+        'alloc_kib_max': max(page_peaks, default=0) / 1024,
+        'peak_rss_kib': peak_rss_kib(),
+    }
+
+def benchmarks(kinds, backends):
+    for kind in kinds:
+        if kind == 'calendar':
+            yield kind, 'text'
+            continue
+        available = SECTION_PARSERS if kind == 'sections' else SEAT_PARSERS
+        for backend in sorted(available):
+            if not backends or backend in backends:
+                yield kind, backend
+
+def print_table(results):
+    print(f"{'kind':<9} {'backend':<7} {'pages':>5} {'rows':>5} {'pages/s':>9} {'rows/s':>9} "
+          f"{'alloc KiB/page':>14} {'max KiB':>8} {'peak RSS MiB':>12}")
+    for result in results:
+        rss = f"{result['peak_rss_kib'] / 1024:.1f}" if result['peak_rss_kib'] is not None else 'n/a'
+        print(f"{result['kind']:<9} {result['backend']:<7} {result['pages']:>5} {result['rows']:>5} "
+              f"{result['pages_per_sec']:>9.1f} {result['rows_per_sec']:>9.1f} "
+              f"{result['alloc_kib_per_page']:>14.1f} {result['alloc_kib_max']:>8.1f} {rss:>12}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the BAN1P and Kuali parsers over the golden fixtures.")
+    parser.add_argument('--kinds', nargs='+', choices=['sections', 'seats', 'calendar'],
+                        default=['sections', 'seats', 'calendar'], help="which parsers to benchmark")
+    parser.add_argument('--backends', nargs='+', help="only these BAN1P backends (default: all available)")
+    parser.add_argument('--rounds', type=int, default=5, help="timed passes over the corpus per backend")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    # A fresh process per backend, so peak RSS and imports are not shared
+    context = multiprocessing.get_context('spawn')
+    for kind, backend in benchmarks(args.kinds, args.backends):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results.append(executor.submit(run_backend, kind, backend, args.rounds).result())
+
+    print_table(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=1)
+
+    failed = [result for result in results if result['mismatches']]
+    for result in failed:
+        print(f"{result['kind']}/{result['backend']}: {result['mismatches']} of {result['rows']} rows "
+              f"do not match the checked-in CSV.")
+    if failed:
+        sys.exit(1)
+    print("All parsed rows match the checked-in CSVs.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+# End-to-end benchmark of every scraper entry point against the stand-in
+# server. Each run records wall time, requests/sec, CPU time and peak RSS per
+# scraper in a JSON history, compares them with the last run made with the
+# same settings, and fails when any of them regressed past --threshold.
+import argparse
+import csv
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from scraper_common.fixtures import BANNER_FIXTURES, KUALI_FIXTURES
+
+STANDIN = os.path.join(ROOT, 'benchmarks', 'standin-server.py')
+DEFAULT_HISTORY = os.path.join(ROOT, 'benchmarks', 'history.json')
+
+# Scrapers run through this so the retry jitter and scraper.py's politeness
+# delay draw the same numbers every run. As with 'python script.py', the
+# script's own directory goes first on sys.path.
+BOOTSTRAP = ("import os, random, runpy, sys; random.seed(int(sys.argv[1])); "
+             "sys.argv = sys.argv[2:]; sys.path[0] = os.path.dirname(sys.argv[0]); "
+             "runpy.run_path(sys.argv[0], run_name='__main__')")
+
+# Higher is worse for these; requests/sec is checked the other way round
+COST_METRICS = ('wall_seconds', 'cpu_seconds', 'peak_rss_mib')
+
+
+def fixture_courses_csv(path):
+    # Every course with a listing page in the fixtures
+    courses = set()
+    for name in os.listdir(os.path.join(BANNER_FIXTURES, 'listcrse')):
+        term, subject, course_number = name[:-len('.html')].split('_')
+        courses.add((subject, course_number))
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['UVIC Course Description', 'Subject', 'Course Number', 'Course Name'])
+        for subject, course_number in sorted(courses):
+            writer.writerow([f"{subject}{course_number}", subject, course_number, ''])
+    return path
+
+
+def fixture_sections_csv(path):
+    # Every CRN with a seat detail page in the fixtures
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['term', 'crn'])
+        for name in sorted(os.listdir(os.path.join(BANNER_FIXTURES, 'detail_sched'))):
+            writer.writerow(name[:-len('.html')].split('_'))
+    return path
+
+
+def scraper_commands(banner_url, kuali_url, workdir):
+    # name -> (script, output CSV whose rows are counted, arguments); every
+    # scraper writes into workdir and the ones with a response cache bypass
+    # it, so every page is fetched
+    courses = fixture_courses_csv(os.path.join(workdir, 'fixture-courses.csv'))
+    sections = fixture_sections_csv(os.path.join(workdir, 'fixture-sections.csv'))
+    catalog = os.path.join(KUALI_FIXTURES, 'courses_list.json')
+    commands = {
+        # Sleeps 1-3 s between courses, so it only gets the two-course test list
+        'scraper.py': ('scraper.py', 'sections.csv', [
+            '--base-url', banner_url, '--courses', os.path.join(ROOT, 'data', 'courses-list-test.csv'),
+            '--output', 'sections.csv']),
+        'scraper-concurrent.py': ('scraper-concurrent.py', 'sections.csv', [
+            '--base-url', banner_url, '--courses', courses, '--no-cache', '--output', 'sections.csv']),
+        'scraper-concurrent.py --mode course': ('scraper-concurrent.py', 'sections.csv', [
+            '--base-url', banner_url, '--courses', courses, '--no-cache', '--mode', 'course',
+            '--output', 'sections.csv']),
+        'scraper-concurrent.py --mode course -v': ('scraper-concurrent.py', 'sections.csv', [
+            '--base-url', banner_url, '--courses', courses, '--no-cache', '--mode', 'course', '-v',
+            '--output', 'sections.csv']),
+        'seat-capacity/scraper-capacity.py': ('seat-capacity/scraper-capacity.py', 'seats.csv', [
+            '--base-url', banner_url, '--sections', sections, '--no-cache', '--output', 'seats.csv']),
+        'description/scraper-calendar.py': ('description/scraper-calendar.py', 'courses.csv', [
+            '--base-url', kuali_url, '--courses', catalog, '--no-cache', '--output', 'courses.csv']),
+        # All three of the above in one pipelined run; its seat rows are counted
+        'run-pipeline.py': ('run-pipeline.py', 'seats.csv', [
+            '--base-url', banner_url, '--kuali-url', kuali_url, '--courses', courses, '--catalog', catalog,
+            '--no-cache', '--sections-output', 'sections.csv', '--seats-output', 'seats.csv',
+            '--calendar-output', 'courses.csv']),
+    }
+    return {name: (os.path.join(ROOT, script), output, args) for name, (script, output, args) in commands.items()
+            if os.path.exists(os.path.join(ROOT, script))}
+
+
+def start_standin(latency, error_rate, seed):
+    process = subprocess.Popen(
+        [sys.executable, STANDIN, '--port', '0', '--latency', latency,
+         '--error-rate', str(error_rate), '--seed', str(seed)],
+        stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith('Serving fixtures on '):
+        process.kill()
+        raise RuntimeError(f"stand-in server did not start: {line!r}")
+    return process, line.split(' on ', 1)[1].strip()
+
+
+def request_count(server_url):
+    with urllib.request.urlopen(server_url + '/__stats') as response:
+        return json.load(response)['requests']
+
+
+def count_rows(path):
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        return max(sum(1 for _ in csv.reader(f)) - 1, 0)
+
+
+def run_once(script, args, workdir, server_url, seed, log):
+    # Wall time, request count, CPU time and peak RSS of one scraper run
+    before = request_count(server_url)
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-c', BOOTSTRAP, str(seed), script] + args,
+                               cwd=workdir, stdout=log, stderr=subprocess.STDOUT)
+    if hasattr(os, 'wait4'):
+        # The rusage covers the scraper and the parse workers it reaped
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        cpu = usage.ru_utime + usage.ru_stime
+        peak_kib = usage.ru_maxrss // 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+        peak_rss = peak_kib / 1024
+    else:  # Windows has no wait4
+        process.wait()
+        cpu = peak_rss = None
+    wall = time.perf_counter() - start
+    return {
+        'exit_code': process.returncode,
+        'wall_seconds': wall,
+        'requests': request_count(server_url) - before,
+        'cpu_seconds': cpu,
+        'peak_rss_mib': peak_rss,
+    }
+
+
+def benchmark(name, script, output, args, server_url, seed, repeat):
+    # Median over the repeats, in a fresh working directory each time
+    runs = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as workdir:
+            with open(os.path.join(workdir, 'output.log'), 'w', encoding='utf-8') as log:
+                run = run_once(script, args, workdir, server_url, seed, log)
+            run['rows'] = count_rows(os.path.join(workdir, output))
+            if run['exit_code']:
+                with open(os.path.join(workdir, 'output.log'), 'r', encoding='utf-8') as log:
+                    print(f"{name} exited with {run['exit_code']}:\n{log.read()[-2000:]}")
+            runs.append(run)
+
+    def median(metric):
+        values = [run[metric] for run in runs if run[metric] is not None]
+        return statistics.median(values) if values else None
+
+    result = {metric: median(metric) for metric in ('wall_seconds', 'requests', 'cpu_seconds', 'peak_rss_mib')}
+    result['requests_per_sec'] = result['requests'] / result['wall_seconds'] if result['wall_seconds'] else 0
+    result['rows'] = runs[-1]['rows']
+    result['exit_code'] = max(run['exit_code'] for run in runs)
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_history(path, history):
+    # Written beside the old history and swapped in, like the sync state
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(history, f, indent=1)
+        f.write('\n')
+    os.replace(temp_path, path)
+
+
+def find_baseline(history, settings, name):
+    # The most recent recorded result for this scraper under the same settings
+    for entry in reversed(history):
+        if entry['settings'] == settings and name in entry['results']:
+            return entry['results'][name]
+    return None
+
+
+def regressions(result, baseline, threshold):
+    # Human-readable reasons this result is worse than its baseline
+    found = []
+    if result['exit_code']:
+        found.append(f"exited with {result['exit_code']}")
+    if baseline is None:
+        return found
+    if result['rows'] != baseline['rows']:
+        found.append(f"wrote {result['rows']} rows, baseline {baseline['rows']}")
+    for metric in COST_METRICS:
+        if result[metric] is not None and baseline.get(metric):
+            change = result[metric] / baseline[metric] - 1
+            if change > threshold:
+                found.append(f"{metric} +{change:.0%}")
+    if baseline.get('requests_per_sec') and result['requests_per_sec']:
+        change = result['requests_per_sec'] / baseline['requests_per_sec'] - 1
+        if change < -threshold:
+            found.append(f"requests_per_sec {change:.0%}")
+    return found
+
+
+def format_change(result, baseline):
+    if baseline is None or not baseline.get('wall_seconds'):
+        return 'new'
+    return f"{result['wall_seconds'] / baseline['wall_seconds'] - 1:+.0%}"
+
+
+def markdown_table(results, baselines):
+    lines = [
+        '| Script | Requests | Wall time | Requests/s | CPU time | Peak RSS | Wall vs baseline |',
+        '|---|--:|--:|--:|--:|--:|--:|',
+    ]
+    for name, result in results.items():
+        cpu = f"{result['cpu_seconds']:.2f} s" if result['cpu_seconds'] is not None else 'n/a'
+        rss = f"{result['peak_rss_mib']:.0f} MiB" if result['peak_rss_mib'] is not None else 'n/a'
+        lines.append(f"| `{name}` | {result['requests']} | {result['wall_seconds']:.2f} s | "
+                     f"{result['requests_per_sec']:.1f} | {cpu} | {rss} | {format_change(result, baselines[name])} |")
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every scraper end to end against the fixture stand-in server.")
+    parser.add_argument('--scrapers', nargs='+', help="only these scrapers (default: all)")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per scraper; the median is recorded")
+    parser.add_argument('--latency', default='fixed:20', help="stand-in response delay, see standin-server.py --latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="stand-in fraction of 5xx responses")
+    parser.add_argument('--seed', type=int, default=1, help="seed for the stand-in and the scrapers' random draws")
+    parser.add_argument('--history', default=DEFAULT_HISTORY, help="JSON file of previous runs")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="fractional change past the baseline that counts as a regression")
+    parser.add_argument('--markdown', help="also write the comparison table to this file")
+    parser.add_argument('--no-record', action='store_true', help="compare only, do not append this run to the history")
+    args = parser.parse_args()
+
+    settings = {'latency': args.latency, 'error_rate': args.error_rate, 'seed': args.seed, 'repeat': args.repeat}
+    history = load_history(args.history)
+
+    standin, server_url = start_standin(args.latency, args.error_rate, args.seed)
+    try:
+        with tempfile.TemporaryDirectory() as inputs:
+            commands = scraper_commands(server_url + '/BAN1P', server_url, inputs)
+            unknown = set(args.scrapers or []) - set(commands)
+            if unknown:
+                parser.error(f"unknown scrapers: {', '.join(sorted(unknown))} (choose from {', '.join(commands)})")
+            results = {}
+            for name, (script, output, script_args) in commands.items():
+                if args.scrapers and name not in args.scrapers:
+                    continue
+                print(f"Benchmarking {name}...", flush=True)
+                results[name] = benchmark(name, script, output, script_args, server_url, args.seed, args.repeat)
+    finally:
+        standin.terminate()
+        standin.wait()
+
+    baselines = {name: find_baseline(history, settings, name) for name in results}
+    table = markdown_table(results, baselines)
+    print()
+    print(table)
+    if args.markdown:
+        with open(args.markdown, 'w', encoding='utf-8') as f:
+            f.write(table)
+
+    failed = {name: found for name, result in results.items()
+              if (found := regressions(result, baselines[name], args.threshold))}
+    for name, found in failed.items():
+        print(f"Regression in {name}: {', '.join(found)}")
+    # A regressed run is not recorded, so it never becomes the next baseline
+    if not args.no_record and not failed:
+        history.append({
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': sys.version.split()[0],
+            'platform': sys.platform,
+            'settings': settings,
+            'results': results,
+        })
+        save_history(args.history, history)
+        print(f"Recorded in {args.history}")
+    if failed:
+        sys.exit(1)
+    print(f"No regressions past {args.threshold:.0%}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+# Local stand-in for BAN1P and the Kuali catalog API. It serves the recorded
+# pages in fixtures/ so the scrapers can be load tested end to end without
+# touching UVIC, with configurable latency, server errors, hung requests and
+# rate limiting. Point the scrapers at it with --base-url.
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import time
+
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from scraper_common.fixtures import BANNER_FIXTURES, KUALI_FIXTURES, kuali_course_path
+
+# What Banner answers for a search or CRN it has nothing for
+EMPTY_LISTING = b'''<!DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 4.01 Transitional//EN" "http://www.w3.org/TR/html4/loose.dtd">
+<html lang="en">
+<head><meta http-equiv="Content-Type" content="text/html; charset=UTF-8"><title>Class Schedule Listing</title></head>
+<body><div class="pagebodydiv"><span class="warningtext">No classes were found that meet your search criteria</span></div></body>
+</html>
+'''
+EMPTY_DETAILS = EMPTY_LISTING.replace(b'Class Schedule Listing', b'Detailed Class Information')
+
+
+def parse_latency(spec):
+    # 'fixed:MS', 'uniform:LOW_MS:HIGH_MS', 'exponential:MEAN_MS' or
+    # 'lognormal:MEDIAN_MS:SIGMA'; returns a function drawing seconds
+    name, _, params = spec.partition(':')
+    values = [float(value) for value in params.split(':')] if params else []
+    try:
+        if name == 'fixed':
+            (ms,) = values
+            return lambda rng: ms / 1000
+        if name == 'uniform':
+            low, high = values
+            return lambda rng: rng.uniform(low, high) / 1000
+        if name == 'exponential':
+            (mean,) = values
+            return lambda rng: rng.expovariate(1 / mean) / 1000 if mean > 0 else 0
+        if name == 'lognormal':
+            median, sigma = values
+            return lambda rng: rng.lognormvariate(math.log(median), sigma) / 1000
+    except ValueError:
+        pass
+    raise argparse.ArgumentTypeError(f"invalid latency distribution: {spec}")
+
+
+class TokenBucket:
+    """Allows rate requests per second with bursts of up to burst requests."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self):
+        # 0 if a request may proceed now, otherwise seconds until it may
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class StandIn:
+    """Fixture handlers plus the fault injection applied in front of them."""
+
+    def __init__(self, latency, error_rate=0.0, timeout_rate=0.0, hang_seconds=60,
+                 rate_limit=0, burst=None, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.bucket = TokenBucket(rate_limit, burst or max(1, int(rate_limit))) if rate_limit else None
+        self.rng = random.Random(seed)
+        self.files = {}
+        self.stats = {'requests': 0, 'statuses': {}, 'errors_injected': 0, 'hangs_injected': 0, 'rate_limited': 0}
+
+    def read(self, path):
+        if path not in self.files:
+            try:
+                with open(path, 'rb') as f:
+                    self.files[path] = f.read()
+            except FileNotFoundError:
+                self.files[path] = None
+        return self.files[path]
+
+    @web.middleware
+    async def faults(self, request, handler):
+        if request.path == '/__stats':
+            return await handler(request)
+        self.stats['requests'] += 1
+        if self.bucket:
+            wait = self.bucket.take()
+            if wait:
+                self.stats['rate_limited'] += 1
+                return self.count(web.Response(status=429, headers={'Retry-After': str(math.ceil(wait))}))
+        draw = self.rng.random()
+        if draw < self.timeout_rate:
+            # Never answers in time; the client's timeout fires first
+            self.stats['hangs_injected'] += 1
+            await asyncio.sleep(self.hang_seconds)
+        elif draw < self.timeout_rate + self.error_rate:
+            self.stats['errors_injected'] += 1
+            await asyncio.sleep(self.latency(self.rng))
+            return self.count(web.Response(status=self.rng.choice([500, 502, 503])))
+        await asyncio.sleep(self.latency(self.rng))
+        return self.count(await handler(request))
+
+    def count(self, response):
+        statuses = self.stats['statuses']
+        statuses[str(response.status)] = statuses.get(str(response.status), 0) + 1
+        return response
+
+    def respond(self, request, body, content_type):
+        # Supports the cache's conditional requests with a content ETag
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.Response(body=body, headers={'ETag': etag, 'Content-Type': content_type})
+
+    def banner_page(self, request, *parts, empty=EMPTY_LISTING):
+        body = self.read(os.path.join(BANNER_FIXTURES, *parts))
+        return self.respond(request, body if body is not None else empty, 'text/html; charset=UTF-8')
+
+    async def listcrse(self, request):
+        query = request.query
+        return self.banner_page(request, 'listcrse', f"{query.get('term_in')}_{query.get('subj_in')}_{query.get('crse_in')}.html")
+
+    async def subject_search(self, request):
+        # Banner sends sel_subj twice, first as 'dummy'
+        subjects = [value for value in request.query.getall('sel_subj', []) if value != 'dummy']
+        subject = subjects[-1] if subjects else ''
+        return self.banner_page(request, 'subject', f"{request.query.get('term_in')}_{subject}.html")
+
+    async def detail_sched(self, request):
+        query = request.query
+        return self.banner_page(request, 'detail_sched', f"{query.get('term_in')}_{query.get('crn_in')}.html",
+                                empty=EMPTY_DETAILS)
+
+    async def kuali_courses(self, request):
+        return self.respond(request, self.read(os.path.join(KUALI_FIXTURES, 'courses_list.json')), 'application/json')
+
+    async def kuali_course(self, request):
+        body = self.read(kuali_course_path(request.match_info['pid']))
+        if body is None:
+            return web.json_response({'error': 'Not found'}, status=404)
+        return self.respond(request, body, 'application/json')
+
+    async def report(self, request):
+        return web.json_response(self.stats)
+
+    def app(self):
+        app = web.Application(middlewares=[self.faults])
+        app.router.add_get('/BAN1P/bwckctlg.p_disp_listcrse', self.listcrse)
+        app.router.add_get('/BAN1P/bwckschd.p_get_crse_unsec', self.subject_search)
+        app.router.add_get('/BAN1P/bwckschd.p_disp_detail_sched', self.detail_sched)
+        app.router.add_get('/api/v1/catalog/courses/{catalog}', self.kuali_courses)
+        app.router.add_get('/api/v1/catalog/course/{catalog}/{pid}', self.kuali_course)
+        app.router.add_get('/__stats', self.report)
+        return app
+
+
+async def serve(standin, host, port):
+    runner = web.AppRunner(standin.app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    # With --port 0 the system picks one; the benchmark runner reads it from here
+    port = runner.addresses[0][1]
+    print(f"Serving fixtures on http://{host}:{port}", flush=True)
+    print(f"  BAN1P base URL: http://{host}:{port}/BAN1P", flush=True)
+    print(f"  Kuali base URL: http://{host}:{port}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the BAN1P and Kuali fixtures with injected latency and faults.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080, help="0 picks a free port")
+    parser.add_argument('--latency', type=parse_latency, default='fixed:0',
+                        help="per-response delay: fixed:MS, uniform:LOW:HIGH, exponential:MEAN or lognormal:MEDIAN:SIGMA")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered with 500/502/503")
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help="fraction of requests that hang")
+    parser.add_argument('--hang-seconds', type=float, default=60, help="how long a hung request takes to answer")
+    parser.add_argument('--rate-limit', type=float, default=0,
+                        help="requests per second before 429 with Retry-After (0 disables)")
+    parser.add_argument('--burst', type=int, help="requests allowed in a burst under --rate-limit")
+    parser.add_argument('--seed', type=int, help="seed for reproducible latency and fault draws")
+    args = parser.parse_args()
+
+    standin = StandIn(args.latency, args.error_rate, args.timeout_rate, args.hang_seconds,
+                      args.rate_limit, args.burst, args.seed)
+    try:
+        asyncio.run(serve(standin, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(standin.stats), flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+import argparse
+import os
+import sys
+
+from scraper_common.banner import SECTION_PARSERS, SEAT_PARSERS
+from scraper_common.fixtures import BANNER_FIXTURES, load_banner_pages
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that every parser backend matches the BeautifulSoup reference.")
+    parser.add_argument('--fixtures', default=BANNER_FIXTURES, help="directory of saved BAN1P pages")
+    args = parser.parse_args()
+
+    pages = 0
+    mismatches = 0
+    for kind, path, page_args in load_banner_pages(args.fixtures):
+        parsers = SECTION_PARSERS if kind == 'sections' else SEAT_PARSERS
+        with open(path, 'rb') as f:
+            content = f.read()
+        expected = parsers['bs4'](content, *page_args)
+        for name, parse in parsers.items():
+            if name == 'bs4':
+                continue
+            actual = parse(content, *page_args)
+            if actual != expected:
+                mismatches += 1
+                print(f"{name} differs from bs4 on {os.path.relpath(path, args.fixtures)}")
+                for want, got in zip(expected or [], actual or []):
+                    if want != got:
+                        print(f"  expected {want}\n  got      {got}")
+                        break
+        pages += 1
+
+    print(f"Checked {pages} pages with backends: {', '.join(sorted(set(SECTION_PARSERS) | set(SEAT_PARSERS)))}.")
+    if mismatches:
+        print(f"{mismatches} mismatches.")
+        sys.exit(1)
+    print("All backends match.")
+
+if __name__ == "__main__":
+    main()
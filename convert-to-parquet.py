@@ -0,0 +1,49 @@
+import argparse
+import csv
+import os
+import sys
+
+from scraper_common.columnar import ParquetStreamWriter, SECTION_COLUMNS, SEAT_COLUMNS, ROW_GROUP_SIZE
+from scraper_common.records import SECTION_FIELDS
+from scraper_common.banner import SEAT_FIELDS
+
+# Converts scraped sections or seat CSVs to Parquet, e.g. the files in
+# scraped-data/. The columns are picked from the CSV's header.
+
+
+def convert(csv_path, parquet_path, row_group_size=ROW_GROUP_SIZE):
+    with open(csv_path, 'r', newline='', encoding='utf-8') as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader)
+        if header == SECTION_FIELDS:
+            columns = SECTION_COLUMNS
+        elif header == SEAT_FIELDS:
+            columns = SEAT_COLUMNS
+        else:
+            sys.exit(f"{csv_path} is not a sections or seat capacity CSV.")
+        writer = ParquetStreamWriter(parquet_path, columns, row_group_size)
+        try:
+            for row in reader:
+                writer.write([row])
+        finally:
+            writer.close()
+    return writer.rows_written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert scraped CSVs to Parquet.")
+    parser.add_argument('csv', nargs='+', help="sections or seat capacity CSVs")
+    parser.add_argument('--output-dir', help="where the .parquet files go (default: next to each CSV)")
+    parser.add_argument('--row-group-size', type=int, default=ROW_GROUP_SIZE, help="rows per Parquet row group")
+    args = parser.parse_args()
+    if not ParquetStreamWriter.available:
+        parser.error("Parquet output needs pyarrow: pip install pyarrow")
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    for csv_path in args.csv:
+        base = os.path.splitext(os.path.basename(csv_path))[0] + '.parquet'
+        parquet_path = os.path.join(args.output_dir or os.path.dirname(csv_path), base)
+        rows = convert(csv_path, parquet_path, args.row_group_size)
+        csv_size, parquet_size = os.path.getsize(csv_path), os.path.getsize(parquet_path)
+        print(f"{csv_path}: {rows} rows, {csv_size / 1024:.0f} KiB -> {parquet_path}: "
+              f"{parquet_size / 1024:.0f} KiB ({parquet_size / csv_size:.0%})")
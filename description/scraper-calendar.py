@@ -1,105 +1,256 @@
-import requests
+import aiohttp
+import asyncio
+import csv
 import json
-import pandas as pd
-from bs4 import BeautifulSoup
+import logging
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
+import os
+import sys
 
-# Function to process a single course
-def process_course(course):
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from scraper_common.http_cache import ResponseCache, DEFAULT_CACHE_DIR, fetch_cached
+from scraper_common.concurrency import AdaptiveLimiter, DEFAULT_MAX_CONCURRENCY
+from scraper_common.retry import RetryScheduler
+from scraper_common.pipeline import CsvStreamWriter, run_pipeline
+from scraper_common.parsing import ParseStage
+from scraper_common.text import html_fragments_to_text
+from scraper_common.sync_state import SyncState
+from scraper_common.json_stream import iter_json_array
+from scraper_common.metrics import METRICS, serve_metrics
+from scraper_common.log import setup_logging
+from scraper_common.tracing import request_spans, trace_config, start_trace, stop_trace, stage_summary
+from scraper_common.records import COURSE_FIELDS
+from scraper_common.store import SqliteStore
+
+logger = logging.getLogger(__name__)
+
+CONCURRENT_REQUESTS = 10  # starting point, the limiter adapts from here
+KEEPALIVE_TIMEOUT = 30  # seconds an idle connection to Kuali is kept open
+
+# Overridden with --base-url to scrape a stand-in server instead
+BASE_URL = "https://uvic.kuali.co"
+CATALOG_ID = "65eb47906641d7001c157bc4"
+
+def course_url(pid, base_url=BASE_URL):
+    return f"{base_url}/api/v1/catalog/course/{CATALOG_ID}/{pid}"
+
+def course_row(course, course_detail):
+    # Builds the output row from a catalog listing entry and its course detail
     pid = course.get('pid')
     subject_code = course.get('subjectCode', {}).get('name', '')
     course_id = course.get('__catalogCourseId', '')
     title = course.get('title', '')
 
-    print(f"Processing Course ID: {course_id}, PID: {pid}")
-
-    # Construct the API URL
-    api_url = f"https://uvic.kuali.co/api/v1/catalog/course/65eb47906641d7001c157bc4/{pid}"
-    try:
-        # Fetch the course details
-        response = requests.get(api_url)
-        if response.status_code == 200:
-            course_detail = response.json()
-
-            # Extract fields from the course detail
-            description_html = course_detail.get('description', '')
-            # Use BeautifulSoup to remove HTML tags
-            description = BeautifulSoup(description_html, 'html.parser').get_text(separator=' ', strip=True)
-
-            # Collect other fields as needed
-            credits = course_detail.get('credits', {}).get('value', '')
-
-            # Handle prerequisites and corequisites
-            pre_and_corequisites = course_detail.get('preAndCorequisites', '')
-
-            if isinstance(pre_and_corequisites, dict):
-                pre_requisites = pre_and_corequisites.get('rulesText', '')
-            elif isinstance(pre_and_corequisites, str):
-                pre_requisites = BeautifulSoup(pre_and_corequisites, 'html.parser').get_text(separator=' ', strip=True)
-            else:
-                pre_requisites = ''
-
-            corequisites = course_detail.get('corequisites', '')
-            if isinstance(corequisites, dict):
-                corequisites_text = corequisites.get('rulesText', '')
-            elif isinstance(corequisites, str):
-                corequisites_text = BeautifulSoup(corequisites, 'html.parser').get_text(separator=' ', strip=True)
-            else:
-                corequisites_text = ''
-
-            # Recommendations and notes
-            recommendations_html = course_detail.get('recommendations', '')
-            recommendations = BeautifulSoup(recommendations_html, 'html.parser').get_text(separator=' ', strip=True)
-
-            notes_html = course_detail.get('supplementalNotes', '')
-            notes = BeautifulSoup(notes_html, 'html.parser').get_text(separator=' ', strip=True)
-
-            # Create a dictionary for the course data
-            course_data = {
-                'PID': pid,
-                'Course ID': course_id,
-                'Subject Code': subject_code,
-                'Title': title,
-                'Description': description,
-                'Credits': credits,
-                'Prerequisites': pre_requisites,
-                'Corequisites': corequisites_text,
-                'Recommendations': recommendations,
-                'Notes': notes
-            }
-
-            return course_data
-        else:
-            print(f"Failed to retrieve data for Course ID: {course_id}, PID: {pid}. Status code: {response.status_code}")
+    # Extract fields from the course detail
+    description_html = course_detail.get('description', '')
+
+    # Collect other fields as needed
+    credits = course_detail.get('credits', {}).get('value', '')
+
+    # Prerequisites and corequisites are either rule objects or HTML
+    pre_and_corequisites = course_detail.get('preAndCorequisites', '')
+    corequisites = course_detail.get('corequisites', '')
+
+    # Every HTML field of the course is converted to text in one pass
+    fragments = [description_html, course_detail.get('recommendations', ''), course_detail.get('supplementalNotes', '')]
+    for requisites in (pre_and_corequisites, corequisites):
+        if isinstance(requisites, str):
+            fragments.append(requisites)
+    texts = html_fragments_to_text(fragments)
+    description, recommendations, notes = texts[:3]
+    requisite_texts = iter(texts[3:])
+
+    if isinstance(pre_and_corequisites, dict):
+        pre_requisites = pre_and_corequisites.get('rulesText', '')
+    elif isinstance(pre_and_corequisites, str):
+        pre_requisites = next(requisite_texts)
+    else:
+        pre_requisites = ''
+
+    if isinstance(corequisites, dict):
+        corequisites_text = corequisites.get('rulesText', '')
+    elif isinstance(corequisites, str):
+        corequisites_text = next(requisite_texts)
+    else:
+        corequisites_text = ''
+
+    # Create a dictionary for the course data
+    return {
+        'PID': pid,
+        'Course ID': course_id,
+        'Subject Code': subject_code,
+        'Title': title,
+        'Description': description,
+        'Credits': credits,
+        'Prerequisites': pre_requisites,
+        'Corequisites': corequisites_text,
+        'Recommendations': recommendations,
+        'Notes': notes
+    }
+
+def parse_course(course, body):
+    return course_row(course, json.loads(body))
+
+# Function to process a single course
+async def process_course(session, limiter, retry, parse_stage, course, cache=None, base_url=BASE_URL):
+    pid = course.get('pid')
+    course_id = course.get('__catalogCourseId', '')
+    with request_spans(f"Course ID: {course_id}, PID: {pid}"):
+        logger.debug("Processing Course ID: %s, PID: %s", course_id, pid)
+
+        # Construct the API URL
+        api_url = course_url(pid, base_url)
+        # Fetch the course details, reusing the cached copy while it is fresh.
+        # Each attempt holds a limiter slot only while its request is in flight.
+        body = await retry.run(
+            api_url,
+            lambda: fetch_cached(session, cache, api_url, limiter=limiter),
+            f"Course ID: {course_id}, PID: {pid}"
+        )
+        if body is None:
+            logger.warning("Failed to retrieve data for Course ID: %s, PID: %s.", course_id, pid)
+            return None
+        try:
+            return await parse_stage.run(parse_course, course, body)
+        except Exception as e:
+            logger.error("Error processing Course ID: %s, PID: %s. Error: %s", course_id, pid, e)
             return None
-    except Exception as e:
-        print(f"Error processing Course ID: {course_id}, PID: {pid}. Error: {e}")
-        return None
 
-# Load the courses data from the JSON file
-with open('courses_list.json', 'r', encoding='utf-8') as f:
-    courses_list = json.load(f)
+def read_output_rows(path):
+    # Rows of a previous run's output, if there is one
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        yield from csv.DictReader(f)
+
+async def main(cache=None, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+               courses_path='courses_list.json', output='scraped_course_data.csv',
+               sync=False, state_path='calendar_sync_state.json', base_url=BASE_URL, metrics_port=None,
+               trace_path=None, profile_path=None, sqlite_path=None):
+    start_time = time.time()
+    if trace_path:
+        start_trace(trace_path)
+    metrics_server = await serve_metrics(METRICS, metrics_port) if metrics_port else None
+    if metrics_server:
+        logger.info("Serving metrics on http://127.0.0.1:%d/metrics", metrics_port)
 
-# List to store the processed course data
-course_data_list = []
+    state = SyncState(state_path) if sync else None
+    existing = {row['Course ID'] for row in read_output_rows(output)} if sync else set()
+    seen = set()
+    counts = {'unchanged': 0}
 
-# Implement concurrency using ThreadPoolExecutor
-num_workers = 10  # Adjust the number of workers as needed
+    def pending_courses(courses):
+        # Catalog entries to fetch; a sync skips the ones it already has
+        for course in courses:
+            course_id = course.get('__catalogCourseId', '')
+            seen.add(course_id)
+            if sync and state.is_current(course) and course_id in existing:
+                counts['unchanged'] += 1
+                continue
+            yield course
 
-with ThreadPoolExecutor(max_workers=num_workers) as executor:
-    future_to_course = {executor.submit(process_course, course): course for course in courses_list}
+    limiter = AdaptiveLimiter(CONCURRENT_REQUESTS, maximum=max_concurrency)
+    retry = RetryScheduler()
+    # Course JSON is small, so it is converted on the loop rather than in workers
+    parse_stage = ParseStage(0, backend='text', profile_path=profile_path)
+    # Rows are appended as courses finish instead of collected until the end.
+    # A sync writes next to the old output and replaces it once merged.
+    writer = CsvStreamWriter(output + '.tmp' if sync else output, COURSE_FIELDS)
+    fetched = set()
+    # Only fetched courses are upserted; unchanged ones are already stored
+    store = SqliteStore(sqlite_path) if sqlite_path else None
+    store_writer = store.writer('courses') if store else None
 
-    for future in as_completed(future_to_course):
-        course_data = future.result()
+    def write(result):
+        course, course_data = result
         if course_data:
-            course_data_list.append(course_data)
-        else:
-            # Handle courses that failed to process
-            pass
+            writer.write([course_data])
+            if store_writer:
+                store_writer.write([course_data])
+            fetched.add(course_data['Course ID'])
+            if state:
+                state.update(course)
+
+    # One keep-alive connection pool for the whole run, so each course
+    # reuses an open TLS connection to uvic.kuali.co instead of a new one
+    connector = aiohttp.TCPConnector(limit=max_concurrency, keepalive_timeout=KEEPALIVE_TIMEOUT)
+    async with aiohttp.ClientSession(connector=connector, trace_configs=[trace_config()]) as session:
+        async def handle(course):
+            return course, await process_course(session, limiter, retry, parse_stage, course, cache, base_url)
+
+        # One worker per possible slot; the limiter decides how many request at once.
+        # Catalog entries are decoded as the queue takes them, not loaded up front.
+        try:
+            with open(courses_path, 'r', encoding='utf-8') as f:
+                processed = await run_pipeline(pending_courses(iter_json_array(f)), handle, write,
+                                               workers=max_concurrency)
+            if sync:
+                # Unchanged courses, and changed ones that could not be
+                # fetched this time, keep their previous rows
+                writer.write([row for row in read_output_rows(output)
+                              if row['Course ID'] in seen and row['Course ID'] not in fetched])
+        finally:
+            writer.close()
+            if store_writer:
+                store_writer.close()
+            parse_stage.close()
+            stop_trace()
+            if metrics_server:
+                await metrics_server.cleanup()
+    if sync:
+        removed = state.remove_missing(seen)
+        os.replace(writer.filename, output)
+        if store:
+            store.delete('courses', [(course_id,) for course_id in removed])
+        state.save()
+        logger.info("Sync: %d new or changed, %d unchanged, %d removed.", processed, counts['unchanged'], len(removed))
+    if store:
+        store.close()
 
-# Convert the list of course data to a DataFrame and save to CSV
-df = pd.DataFrame(course_data_list)
-df.to_csv('scraped_course_data.csv', index=False, encoding='utf-8')
+    logger.info("%d courses fetched, %d saved to '%s'", len(fetched), writer.rows_written, output)
+    logger.info(limiter.summary())
+    logger.info(retry.summary())
+    logger.info(stage_summary())
+    if cache:
+        logger.info(cache.summary())
+        cache.close()
+    end_time = time.time()
+    total_time = end_time - start_time
+    hours, rem = divmod(total_time, 3600)
+    minutes, seconds = divmod(rem, 60)
+    logger.info("Script execution time: {:0>2}:{:0>2}:{:05.2f}".format(int(hours), int(minutes), seconds))
 
-print("Data saved to 'courses_data.csv'")
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape course details from the UVIC Kuali calendar.")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="on-disk HTTP response cache shared by all scrapers")
+    parser.add_argument('--no-cache', action='store_true', help="always fetch full pages from the network")
+    parser.add_argument('--max-concurrency', type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help="upper bound for the adaptive number of in-flight requests")
+    parser.add_argument('--sync', action='store_true',
+                        help="fetch only courses that are new or changed since the last sync and merge them into the output")
+    parser.add_argument('--state', default='calendar_sync_state.json',
+                        help="catalog metadata seen by the last sync, with tombstones for removed courses")
+    parser.add_argument('--base-url', default=BASE_URL,
+                        help="Kuali root to scrape, e.g. a local stand-in server's http://127.0.0.1:8080")
+    parser.add_argument('--courses', default='courses_list.json', help="catalog course list downloaded from Kuali")
+    parser.add_argument('--output', default='scraped_course_data.csv', help="CSV the course details are written to")
+    parser.add_argument('--sqlite', help="also upsert the course details into this SQLite database; "
+                                         "--sync deletes removed courses from it")
+    parser.add_argument('-v', '--verbose', action='count', default=0, help="log every course as it is processed")
+    parser.add_argument('-q', '--quiet', action='store_true', help="only log warnings and errors")
+    parser.add_argument('--metrics', help="write request, retry, queue and parse metrics here at the end "
+                                          "(JSON for a .json file, Prometheus text otherwise)")
+    parser.add_argument('--metrics-port', type=int, help="serve live metrics on http://127.0.0.1:PORT/metrics")
+    parser.add_argument('--trace', help="write each course's time per stage (queue wait, connect, ttfb, body, "
+                                        "parse) to this file as JSON lines")
+    parser.add_argument('--profile', help="sample the scraper while it converts course details and write a "
+                                          "speedscope profile (or folded stacks for a .folded file)")
+    args = parser.parse_args()
+    setup_logging(-1 if args.quiet else args.verbose)
+    cache = None if args.no_cache else ResponseCache(args.cache_dir)
+    asyncio.run(main(cache, args.max_concurrency, args.courses, args.output, args.sync, args.state,
+                     args.base_url.rstrip('/'), args.metrics_port, args.trace, args.profile,
+                     args.sqlite))
+    if args.metrics:
+        METRICS.write(args.metrics)
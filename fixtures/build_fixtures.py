@@ -0,0 +1,244 @@
+# Rebuilds the BAN1P page and Kuali course fixtures from the checked-in
+# scrape results.
+#
+# BAN1P is behind Netlink authentication now, so the pages cannot be saved
+# again. These are rendered in Banner's markup from the rows we scraped
+# before the change, which lets parsers, benchmarks and the stand-in server
+# run against a known answer: parsing the pages must reproduce the rows of
+# scraped-data/scraped_course_data.csv and seat-capacity/course_capacity_data.csv.
+# The Kuali course documents are rendered the same way from
+# description/scraped_course_data.csv.
+import ast
+import csv
+import hashlib
+import html
+import json
+import os
+import re
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, 'fixtures', 'banner')
+KUALI_FIXTURES = os.path.join(ROOT, 'fixtures', 'kuali')
+SUBJECTS = ['ADMN', 'ATWP', 'ECON', 'ER', 'SLST']
+SCHEDULE_FIELDS = ['frequency', 'time', 'days', 'location', 'date_range', 'schedule_type', 'instructor']
+SCHEDULE_HEADERS = ['Type', 'Time', 'Days', 'Where', 'Date Range', 'Schedule Type', 'Instructors']
+
+PAGE = '''<!DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 4.01 Transitional//EN" "http://www.w3.org/TR/html4/loose.dtd">
+<html lang="en">
+<head>
+<meta http-equiv="Content-Type" content="text/html; charset=UTF-8">
+<link rel="stylesheet" href="/css/web_defaultapp.css" type="text/css">
+<title>{title}</title>
+</head>
+<body>
+<div class="headerwrapperdiv">
+<div class="pageheaderdiv1"><a href="#main_content" onMouseover="window.status='Go to Main Content'; return true" class="skiplinks">Go to Main Content</a><h1>University of Victoria</h1></div>
+</div>
+<div class="pagetitlediv"><h2>{title}</h2></div>
+<div class="pagebodydiv">
+<a name="main_content"></a>
+{body}
+</div>
+<div class="footerbeforediv"></div>
+<div class="footerafterdiv"><span class="releasetext">Release: 8.7.2.4</span></div>
+</body>
+</html>
+'''
+
+
+def text(value):
+    return html.escape(value, quote=False)
+
+
+def cell(value):
+    # Banner fills empty cells with a non-breaking space
+    return text(value) if value else '&nbsp;'
+
+
+def instructor_cell(value):
+    return text(value).replace('(P)', '(<abbr title= "Primary">P</abbr>)')
+
+
+def render_section(row):
+    term = row['term']
+    title = f"{row['course_name']} - {row['crn']} - {row['subject']} {row['course_number']} - {row['section']}"
+    lines = []
+    if row['additional_information']:
+        lines.append(text(row['additional_information']))
+    lines.append(f'<span class="fieldlabeltext">Associated Term: </span>Term {term} ')
+    lines.append('<span class="fieldlabeltext">Levels: </span>Undergraduate ')
+    lines.append('')
+    lines.append('Main Campus')
+    if row['schedule_type']:
+        lines.append(f"{text(row['schedule_type'])} Schedule Type")
+    if row['instructional_method']:
+        lines.append(f"{text(row['instructional_method'])} Instructional Method")
+    if row['units']:
+        lines.append(f"       {row['units']} Credits")
+    lines.append(
+        f'<a href="/BAN1P/bwckctlg.p_display_courses?term_in={term}&amp;one_subj={row["subject"]}'
+        f'&amp;sel_crse_strt={row["course_number"]}&amp;sel_crse_end={row["course_number"]}">View Catalog Entry</a>'
+    )
+    lines.append('')
+    detail = '\n<br>\n'.join(lines)
+    if any(row[field] for field in SCHEDULE_FIELDS):
+        headers = '\n'.join(f'<th class="ddheader" scope="col" >{header}</th>' for header in SCHEDULE_HEADERS)
+        cells = [cell(row[field]) for field in SCHEDULE_FIELDS[:-1]] + [instructor_cell(row['instructor'])]
+        detail += (
+            '\n<table  class="datadisplaytable" summary="This table lists the scheduled meeting times and assigned instructors for this class.."><caption class="captiontext">Scheduled Meeting Times</caption>\n'
+            f'<tr>\n{headers}\n</tr>\n<tr>\n'
+            + '\n'.join(f'<td class="dddefault">{value}</td>' for value in cells)
+            + '\n</tr>\n</table>\n<br>\n<br>'
+        )
+    return (
+        f'<tr>\n<th class="ddtitle" scope="colgroup" ><a href="/BAN1P/bwckschd.p_disp_detail_sched?term_in={term}&amp;crn_in={row["crn"]}">{text(title)}</a></th>\n</tr>\n'
+        f'<tr>\n<td class="dddefault">\n{detail}\n</td>\n</tr>\n'
+    )
+
+
+def render_listing(rows, title):
+    sections = ''.join(render_section(row) for row in rows)
+    body = (
+        '<table  class="datadisplaytable" summary="This layout table is used to present the sections found" width="100%"><caption class="captiontext">Sections Found</caption>\n'
+        f'{sections}</table>\n<br>\n<table  class="datadisplaytable" summary="This is table displays line separator at end of the page." width="100%" cellspacing="0">\n'
+        '<tr>\n<td class="bgtabon" width="100%" colSpan=2><img src="/wtlgifs/web_transparent.gif" alt="Transparent Image" CLASS="headerImg" TITLE="Transparent Image"  NAME="web_transparent" HSPACE=0 VSPACE=0 BORDER=0 HEIGHT=3 WIDTH=10 /></td>\n</tr>\n</table>'
+    )
+    return PAGE.format(title=title, body=body)
+
+
+def render_seats(section, seats):
+    title = f"{section['course_name']} - {section['crn']} - {section['subject']} {section['course_number']} - {section['section']}"
+    rows = []
+    for label, prefix in (('Seats', 'Seats'), ('Waitlist Seats', 'Waitlist')):
+        values = ''.join(
+            f'<td class="dddefault">{seats[f"{prefix}_{column}"]}</td>\n'
+            for column in ('Capacity', 'Actual', 'Remaining')
+        )
+        rows.append(f'<tr>\n<th class="ddlabel" scope="row" ><span class="fieldlabeltext">{label}</span></th>\n{values}</tr>\n')
+    body = (
+        '<table  class="datadisplaytable" summary="This table is used to present the detailed class information." width="100%"><caption class="captiontext">Detailed Class Information</caption>\n'
+        f'<tr>\n<th class="ddlabel" scope="row" >{text(title)}<br /><br /></th>\n</tr>\n'
+        '<tr>\n<td class="dddefault">\n'
+        f'<span class="fieldlabeltext">Associated Term: </span>Term {section["term"]} \n<br>\n'
+        '<table  class="datadisplaytable" summary="This layout table is used to present the seating numbers." width="50%"><caption class="captiontext">Registration Availability</caption>\n'
+        '<tr>\n<th class="ddheader" scope="col" ><span class="fieldlabeltext">&nbsp;</span></th>\n'
+        '<th class="ddheader" scope="col" ><span class="fieldlabeltext">Capacity</span></th>\n'
+        '<th class="ddheader" scope="col" ><span class="fieldlabeltext">Actual</span></th>\n'
+        '<th class="ddheader" scope="col" ><span class="fieldlabeltext">Remaining</span></th>\n</tr>\n'
+        f'{"".join(rows)}</table>\n<br>\n</td>\n</tr>\n</table>'
+    )
+    return PAGE.format(title='Detailed Class Information', body=body)
+
+
+# Course codes and unit counts, which Kuali wraps in links and spans. Only
+# marked up where single spaces separate them from their neighbours, so
+# get_text(' ', strip=True) gives back exactly the scraped text.
+KUALI_MARKUP_REGEX = re.compile(r'(?<![^ ])(?<!  )([A-Z]{2,4} ?\d{3}[A-Z]?|\(\d+(?:\.\d+)?\))(?=( |$))(?!  )')
+
+
+def kuali_html(value):
+    def mark_up(match):
+        token = match.group(1)
+        if token.startswith('('):
+            return f'<span>{text(token)}</span>'
+        return f'<a href="#/courses/view/{token.replace(" ", "")}" target="_blank">{text(token)}</a>'
+    if not value:
+        return value
+    parts = []
+    position = 0
+    for match in KUALI_MARKUP_REGEX.finditer(value):
+        parts.append(text(value[position:match.start()]))
+        parts.append(mark_up(match))
+        position = match.end()
+    parts.append(text(value[position:]))
+    return ''.join(parts)
+
+
+def kuali_credits(value):
+    # The scrape wrote list and range credits with str()
+    if value.startswith(('[', '{')):
+        return ast.literal_eval(value)
+    return value
+
+
+def render_kuali_course(row):
+    course_id = row['Course ID']
+    digest = hashlib.sha1(row['PID'].encode('utf-8')).hexdigest()
+    listing = {
+        '__catalogCourseId': course_id,
+        '__passedCatalogQuery': True,
+        'dateStart': '2020-09-01',
+        'pid': row['PID'],
+        'id': digest[:24],
+        'title': row['Title'],
+        'subjectCode': {'name': row['Subject Code'], 'description': f"{row['Subject Code']} ({row['Subject Code']})",
+                        'id': digest[24:], 'linkedGroup': digest[:24]},
+        'catalogActivationDate': '2020-05-15',
+        '_score': 1,
+    }
+    detail = {key: value for key, value in listing.items() if not key.startswith('_')}
+    detail.update({
+        '__catalogCourseId': course_id,
+        'code': course_id,
+        'credits': {'value': kuali_credits(row['Credits']), 'credits': {'min': '', 'max': ''}},
+        'status': 'active',
+    })
+    if row['Description']:
+        detail['description'] = f"<p>{kuali_html(row['Description'])}</p>"
+    if row['Prerequisites']:
+        detail['preAndCorequisites'] = f"<div><section><div>{kuali_html(row['Prerequisites'])}</div></section></div>"
+    if row['Corequisites']:
+        detail['corequisites'] = f"<div>{kuali_html(row['Corequisites'])}</div>"
+    if row['Recommendations']:
+        detail['recommendations'] = f"<p>{kuali_html(row['Recommendations'])}</p>"
+    if row['Notes']:
+        detail['supplementalNotes'] = f"<ul><li>{kuali_html(row['Notes'])}</li></ul>"
+    return listing, detail
+
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        f.write(content)
+
+
+def main():
+    with open(os.path.join(ROOT, 'scraped-data', 'scraped_course_data-concurrent_with_sections.csv'), encoding='utf-8') as f:
+        sections = [row for row in csv.DictReader(f) if row['subject'] in SUBJECTS]
+    with open(os.path.join(ROOT, 'seat-capacity', 'course_capacity_data.csv'), encoding='utf-8') as f:
+        seats = {(row['term'], row['crn']): row for row in csv.DictReader(f)}
+
+    by_course = {}
+    by_subject = {}
+    for row in sections:
+        by_course.setdefault((row['term'], row['subject'], row['course_number']), []).append(row)
+        by_subject.setdefault((row['term'], row['subject']), []).append(row)
+
+    for (term, subject, number), rows in by_course.items():
+        write(os.path.join(FIXTURES, 'listcrse', f'{term}_{subject}_{number}.html'),
+              render_listing(rows, 'Class Schedule Listing'))
+    for (term, subject), rows in by_subject.items():
+        write(os.path.join(FIXTURES, 'subject', f'{term}_{subject}.html'),
+              render_listing(rows, 'Class Schedule Listing'))
+    written = 0
+    for row in sections:
+        key = (row['term'], row['crn'])
+        if key in seats:
+            write(os.path.join(FIXTURES, 'detail_sched', f'{key[0]}_{key[1]}.html'), render_seats(row, seats[key]))
+            written += 1
+    print(f"Wrote {len(by_course)} course pages, {len(by_subject)} subject listings and {written} seat pages to {FIXTURES}.")
+
+    with open(os.path.join(ROOT, 'description', 'scraped_course_data.csv'), encoding='utf-8') as f:
+        calendar = [row for row in csv.DictReader(f) if row['Subject Code'] in SUBJECTS]
+    listings = []
+    for row in calendar:
+        listing, detail = render_kuali_course(row)
+        listings.append(listing)
+        write(os.path.join(KUALI_FIXTURES, 'course', f"{row['PID']}.json"),
+              json.dumps(detail, ensure_ascii=False, indent=1) + '\n')
+    write(os.path.join(KUALI_FIXTURES, 'courses_list.json'), json.dumps(listings, ensure_ascii=False, indent=1) + '\n')
+    print(f"Wrote {len(listings)} Kuali courses to {KUALI_FIXTURES}.")
+
+
+if __name__ == '__main__':
+    main()
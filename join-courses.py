@@ -0,0 +1,72 @@
+import argparse
+import logging
+import os
+import time
+
+from scraper_common.join import SourceIndex, JoinState, join_sections, source_signature, SEAT_VALUE_FIELDS, \
+    CALENDAR_VALUE_FIELDS
+from scraper_common.log import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# Joins the three scrapers' CSVs into one row per section: its seat counts
+# on (term, crn) and its calendar entry on Course ID (subject and number).
+
+
+def main(sections_path, seats_path, calendar_path, output, state_path, unmatched_path=None, force=False,
+         follow=None):
+    seats = SourceIndex(seats_path, ('term', 'crn'), SEAT_VALUE_FIELDS)
+    calendar = SourceIndex(calendar_path, ('Course ID',), CALENDAR_VALUE_FIELDS)
+    state = JoinState(state_path)
+    if force:
+        state.sources = {}
+    elif not follow and os.path.exists(output) and state.is_current([sections_path, seats_path, calendar_path]):
+        logger.info("%s is up to date with its sources.", output)
+        return
+
+    while True:
+        # Only an index whose source changed is read again
+        for index in (seats, calendar):
+            index.refresh()
+        signatures = {sections_path: source_signature(sections_path), seats_path: seats.signature,
+                      calendar_path: calendar.signature}
+        if signatures != state.sources or not os.path.exists(output):
+            start = time.time()
+            report = join_sections(sections_path, seats, calendar, output)
+            state.save(signatures)
+            if unmatched_path:
+                report.write_unmatched(unmatched_path)
+            logger.info(report.summary())
+            logger.info("Saved to %s in %.2f s.", output, time.time() - start)
+        if not follow:
+            return
+        time.sleep(follow)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Join scraped sections, seat counts and calendar details "
+                                                 "into one row per section.")
+    parser.add_argument('--sections', default=os.path.join('scraped-data', 'scraped_course_data.csv'),
+                        help="sections CSV from scraper-concurrent.py, streamed row by row")
+    parser.add_argument('--seats', default=os.path.join('seat-capacity', 'course_capacity_data.csv'),
+                        help="seat capacity CSV from scraper-capacity.py, joined on term and crn")
+    parser.add_argument('--calendar', default=os.path.join('description', 'scraped_course_data.csv'),
+                        help="course details CSV from scraper-calendar.py, joined on subject and course number")
+    parser.add_argument('--output', default='courses_joined.csv', help="CSV the joined rows are written to")
+    parser.add_argument('--state', help="where the sources' signatures are kept (default: OUTPUT.sources.json)")
+    parser.add_argument('--unmatched', help="also write every key that found no partner to this CSV")
+    parser.add_argument('--force', action='store_true', help="join even if no source has changed")
+    parser.add_argument('--follow', type=float, metavar='SECONDS',
+                        help="keep running and join again whenever a source changes, checking this often")
+    parser.add_argument('-v', '--verbose', action='count', default=0, help="log every index that is rebuilt")
+    parser.add_argument('-q', '--quiet', action='store_true', help="only log warnings and errors")
+    args = parser.parse_args()
+    for path in (args.sections, args.seats, args.calendar):
+        if not os.path.exists(path):
+            parser.error(f"{path} does not exist")
+    setup_logging(-1 if args.quiet else args.verbose)
+    try:
+        main(args.sections, args.seats, args.calendar, args.output, args.state or args.output + '.sources.json',
+             args.unmatched, args.force, args.follow)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,250 @@
+import argparse
+import asyncio
+import csv
+import importlib.util
+import logging
+import os
+import time
+
+import aiohttp
+
+from scraper_common.http_cache import ResponseCache, DEFAULT_CACHE_DIR
+from scraper_common.concurrency import AdaptiveLimiter, DEFAULT_MAX_CONCURRENCY
+from scraper_common.retry import RetryScheduler
+from scraper_common.pipeline import CsvStreamWriter, Stage
+from scraper_common.parsing import ParseStage, DEFAULT_PARSE_WORKERS
+from scraper_common.banner import SECTION_FIELDS, SEAT_FIELDS, SECTION_PARSERS, SEAT_PARSERS, DEFAULT_PARSER
+from scraper_common.records import COURSE_FIELDS
+from scraper_common.json_stream import iter_json_array
+from scraper_common.join import SourceIndex, join_sections, SEAT_VALUE_FIELDS, CALENDAR_VALUE_FIELDS
+from scraper_common.metrics import METRICS, serve_metrics
+from scraper_common.log import setup_logging
+from scraper_common.tracing import trace_config, start_trace, stop_trace, stage_summary
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Runs the three scrapers as one streaming pipeline:
+#
+#   courses list -> section listings -> seat capacity per CRN
+#   Kuali catalog -> calendar details
+#
+# Each stage has its own queue and workers. A CRN is queued for its seat
+# capacity as soon as the listing it is in has parsed it, so the stages
+# run side by side and the whole run takes about as long as the slowest.
+
+CONCURRENT_REQUESTS = 10  # starting point of each host's limiter
+LISTING_WORKERS = 4  # listings in flight; each can queue hundreds of CRNs
+KEEPALIVE_TIMEOUT = 30  # seconds an idle connection to Kuali is kept open
+
+
+def load_script(*path):
+    # The scrapers' file names are not valid module names, so they are loaded by path
+    name = os.path.splitext(path[-1])[0].replace('-', '_')
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, *path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+sections_scraper = load_script('scraper-concurrent.py')
+capacity_scraper = load_script('seat-capacity', 'scraper-capacity.py')
+calendar_scraper = load_script('description', 'scraper-calendar.py')
+
+
+async def main(cache=None, mode='subject', max_concurrency=DEFAULT_MAX_CONCURRENCY,
+               parse_workers=DEFAULT_PARSE_WORKERS, parser_backend=DEFAULT_PARSER,
+               base_url=sections_scraper.BASE_URL, kuali_url=calendar_scraper.BASE_URL,
+               courses_path='courses-list-test.csv', catalog_path='courses_list.json',
+               sections_output='scraped_course_data.csv', seats_output='course_capacity_data.csv',
+               calendar_output='course_details.csv', joined_output=None, listing_workers=LISTING_WORKERS,
+               capacity_workers=DEFAULT_MAX_CONCURRENCY, calendar_workers=DEFAULT_MAX_CONCURRENCY,
+               metrics_port=None, trace_path=None):
+    start_time = time.time()
+    start = time.monotonic()
+    if trace_path:
+        start_trace(trace_path)
+    metrics_server = await serve_metrics(METRICS, metrics_port) if metrics_port else None
+    if metrics_server:
+        logger.info("Serving metrics on http://127.0.0.1:%d/metrics", metrics_port)
+
+    with open(courses_path, 'r', encoding='utf-8') as csvfile:
+        courses_list = list(csv.DictReader(csvfile))
+
+    # BAN1P and Kuali are separate hosts, so each adapts its own concurrency.
+    # Listings and seat capacity share BAN1P's limiter.
+    banner_limiter = AdaptiveLimiter(CONCURRENT_REQUESTS, maximum=max_concurrency)
+    kuali_limiter = AdaptiveLimiter(CONCURRENT_REQUESTS, maximum=max_concurrency)
+    retry = RetryScheduler()
+    if parser_backend in SEAT_PARSERS:
+        parse_stage = seat_parse_stage = ParseStage(parse_workers, backend=parser_backend)
+    else:
+        # Streamed listings are parsed on the loop as they download; seat
+        # pages, which have no streaming parser, get the worker pool
+        parse_stage = ParseStage(0, backend=parser_backend)
+        seat_parse_stage = ParseStage(parse_workers, backend=DEFAULT_PARSER)
+    # Course JSON is small, so it is converted on the loop rather than in workers
+    calendar_parse_stage = ParseStage(0, backend='text')
+    sections_writer = CsvStreamWriter(sections_output, SECTION_FIELDS)
+    seats_writer = CsvStreamWriter(seats_output, SEAT_FIELDS)
+    calendar_writer = CsvStreamWriter(calendar_output, COURSE_FIELDS)
+    queued = set()  # (term, crn) already given to the capacity stage
+
+    connector = aiohttp.TCPConnector(limit=max_concurrency, keepalive_timeout=KEEPALIVE_TIMEOUT)
+    async with aiohttp.ClientSession(trace_configs=[trace_config()]) as banner, \
+            aiohttp.ClientSession(connector=connector, trace_configs=[trace_config()]) as kuali:
+        async def fetch_seats(key):
+            _, _, rows = await capacity_scraper.fetch_and_parse_details(
+                banner, banner_limiter, retry, seat_parse_stage, *key, cache, base_url)
+            if rows:
+                seats_writer.write(rows)
+
+        capacity = Stage('capacity', fetch_seats, capacity_workers)
+
+        def queue_seats(section, waiting):
+            # CRNs that find the capacity queue full wait in their listing's
+            # list, which holds that listing's worker until they fit
+            key = (section['term'], section['crn'])
+            if key not in queued:
+                queued.add(key)
+                try:
+                    capacity.put_nowait(key)
+                except asyncio.QueueFull:
+                    waiting.append(key)
+
+        async def fetch_sections(job):
+            term, subject, course = job
+            waiting = []
+            # Sections reach the capacity queue while the page is still being
+            # parsed with the stream backend, and once it is parsed otherwise
+            if mode == 'subject':
+                tracked = set(course)
+                results = await sections_scraper.fetch_and_parse_subject(
+                    banner, banner_limiter, retry, parse_stage, term, subject, course, cache, base_url,
+                    lambda section: queue_seats(section, waiting) if section['course_number'] in tracked else None)
+            else:
+                sections = await sections_scraper.fetch_and_parse_course(
+                    banner, banner_limiter, retry, parse_stage, term, subject, course, cache, base_url,
+                    lambda section: queue_seats(section, waiting))
+                results = [] if sections is None else [(job, sections)]
+            for _, sections in results:
+                sections_writer.write(sections)
+                for section in sections:
+                    queue_seats(section, waiting)
+            for key in waiting:
+                await capacity.put(key)
+
+        async def fetch_course(course):
+            row = await calendar_scraper.process_course(kuali, kuali_limiter, retry, calendar_parse_stage, course,
+                                                        cache, kuali_url)
+            if row:
+                calendar_writer.write([row])
+
+        listings = Stage('listings', fetch_sections, listing_workers)
+        calendar = Stage('calendar', fetch_course, calendar_workers)
+        stages = [listings, capacity, calendar]
+
+        async def close_capacity():
+            await listings.wait()
+            # Every CRN is queued by now
+            await capacity.close()
+
+        # Every queue is bounded. The stages are waited on together, so a
+        # failing worker in any of them stops the run instead of leaving
+        # the stages that feed it blocked on a full queue.
+        with open(catalog_path, 'r', encoding='utf-8') as catalog:
+            listings.start(sections_scraper.iter_jobs(mode, sections_scraper.TERMS, courses_list, set()))
+            capacity.start()
+            # Catalog entries are decoded as the queue takes them, not loaded up front
+            calendar.start(iter_json_array(catalog))
+            try:
+                await asyncio.gather(close_capacity(), capacity.wait(), calendar.wait())
+            finally:
+                for stage in stages:
+                    stage.cancel()
+                for writer in (sections_writer, seats_writer, calendar_writer):
+                    writer.close()
+                for each in {parse_stage, seat_parse_stage, calendar_parse_stage}:
+                    each.close()
+                stop_trace()
+                if metrics_server:
+                    await metrics_server.cleanup()
+
+    logger.info("%d sections saved to %s, %d seat rows to %s, %d courses to %s.",
+                sections_writer.rows_written, sections_output, seats_writer.rows_written, seats_output,
+                calendar_writer.rows_written, calendar_output)
+    for stage in stages:
+        logger.info(stage.summary(start))
+    if joined_output:
+        seats = SourceIndex(seats_output, ('term', 'crn'), SEAT_VALUE_FIELDS)
+        details = SourceIndex(calendar_output, ('Course ID',), CALENDAR_VALUE_FIELDS)
+        seats.refresh()
+        details.refresh()
+        logger.info(join_sections(sections_output, seats, details, joined_output).summary())
+        logger.info("Joined rows saved to %s.", joined_output)
+    logger.info("BAN1P: %s", banner_limiter.summary())
+    logger.info("Kuali: %s", kuali_limiter.summary())
+    logger.info(retry.summary())
+    logger.info(stage_summary())
+    if cache:
+        logger.info(cache.summary())
+        cache.close()
+    end_time = time.time()
+    total_time = end_time - start_time
+    hours, rem = divmod(total_time, 3600)
+    minutes, seconds = divmod(rem, 60)
+    logger.info("Script execution time: {:0>2}:{:0>2}:{:05.2f}".format(int(hours), int(minutes), seconds))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape sections, seat capacity and calendar details in one "
+                                                 "pipelined run.")
+    parser.add_argument('--mode', choices=['subject', 'course'], default='subject',
+                        help="'subject' fetches one listing per term/subject, 'course' one page per course")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="on-disk HTTP response cache shared by all scrapers")
+    parser.add_argument('--no-cache', action='store_true', help="always fetch full pages from the network")
+    parser.add_argument('--max-concurrency', type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help="upper bound for the adaptive number of in-flight requests to each host")
+    parser.add_argument('--listing-workers', type=int, default=LISTING_WORKERS,
+                        help="section listings fetched at once")
+    parser.add_argument('--capacity-workers', type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help="CRNs whose seat capacity is fetched at once")
+    parser.add_argument('--calendar-workers', type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help="courses whose calendar details are fetched at once")
+    parser.add_argument('--parse-workers', type=int, default=DEFAULT_PARSE_WORKERS,
+                        help="processes used to parse pages (0 parses on the event loop)")
+    parser.add_argument('--parser', choices=sorted(SECTION_PARSERS), default=DEFAULT_PARSER,
+                        help="HTML parser backend; stream queues each CRN while its listing is still downloading")
+    parser.add_argument('--base-url', default=sections_scraper.BASE_URL,
+                        help="BAN1P root to scrape, e.g. a local stand-in server's http://127.0.0.1:8080/BAN1P")
+    parser.add_argument('--kuali-url', default=calendar_scraper.BASE_URL,
+                        help="Kuali root to scrape, e.g. a local stand-in server's http://127.0.0.1:8080")
+    parser.add_argument('--courses', default='courses-list-test.csv', help="CSV of subjects and course numbers to scrape")
+    parser.add_argument('--catalog', default='courses_list.json', help="catalog course list downloaded from Kuali")
+    parser.add_argument('--sections-output', default='scraped_course_data.csv', help="CSV the sections are written to")
+    parser.add_argument('--seats-output', default='course_capacity_data.csv', help="CSV the seat data is written to")
+    parser.add_argument('--calendar-output', default='course_details.csv',
+                        help="CSV the course details are written to")
+    parser.add_argument('--joined', help="also join the three outputs into this CSV, as join-courses.py does")
+    parser.add_argument('-v', '--verbose', action='count', default=0, help="log every request and finished item")
+    parser.add_argument('-q', '--quiet', action='store_true', help="only log warnings and errors")
+    parser.add_argument('--metrics', help="write request, retry, queue and parse metrics here at the end "
+                                          "(JSON for a .json file, Prometheus text otherwise)")
+    parser.add_argument('--metrics-port', type=int, help="serve live metrics on http://127.0.0.1:PORT/metrics")
+    parser.add_argument('--trace', help="write each page's time per stage (queue wait, connect, ttfb, body, "
+                                        "parse) to this file as JSON lines")
+    args = parser.parse_args()
+    for path in (args.courses, args.catalog):
+        if not os.path.exists(path):
+            parser.error(f"{path} does not exist")
+    setup_logging(-1 if args.quiet else args.verbose,
+                  [module.__name__ for module in (sections_scraper, capacity_scraper, calendar_scraper)])
+    cache = None if args.no_cache else ResponseCache(args.cache_dir)
+    asyncio.run(main(cache, args.mode, args.max_concurrency, args.parse_workers, args.parser,
+                     args.base_url.rstrip('/'), args.kuali_url.rstrip('/'), args.courses, args.catalog,
+                     args.sections_output, args.seats_output, args.calendar_output, args.joined,
+                     args.listing_workers, args.capacity_workers, args.calendar_workers,
+                     args.metrics_port, args.trace))
+    if args.metrics:
+        METRICS.write(args.metrics)
@@ -1,183 +1,287 @@
 import asyncio
 import aiohttp
 import csv
-from bs4 import BeautifulSoup
+import logging
 import time
-import re
+import argparse
+from urllib.parse import urlencode
+from scraper_common.http_cache import ResponseCache, DEFAULT_CACHE_DIR, fetch_cached
+from scraper_common.concurrency import AdaptiveLimiter, DEFAULT_MAX_CONCURRENCY
+from scraper_common.retry import RetryScheduler
+from scraper_common.pipeline import CsvStreamWriter, run_pipeline
+from scraper_common.columnar import ParquetStreamWriter, SECTION_COLUMNS
+from scraper_common.store import SqliteStore
+from scraper_common.journal import Journal
+from scraper_common.records import SectionRow
+from scraper_common.banner import SECTION_FIELDS, SECTION_PARSERS, DEFAULT_PARSER, SectionStreamParser, parse_html_rows
+from scraper_common.parsing import ParseStage, DEFAULT_PARSE_WORKERS, record_parse
+from scraper_common.metrics import METRICS, serve_metrics
+from scraper_common.log import setup_logging
+from scraper_common.tracing import request_spans, trace_config, start_trace, stop_trace, stage_summary
 
-# Maximum number of concurrent requests
+logger = logging.getLogger(__name__)
+
+# Starting number of concurrent requests, adjusted at runtime by the limiter
 CONCURRENT_REQUESTS = 10
 
-async def fetch_course_data(session, sem, term, subject, course_number):
-    url = f"https://www.uvic.ca/BAN1P/bwckctlg.p_disp_listcrse?term_in={term}&subj_in={subject}&crse_in={course_number}&schd_in="
+# Overridden with --base-url to scrape a stand-in server instead
+BASE_URL = "https://www.uvic.ca/BAN1P"
+
+TERMS = ['202409', '202501']
+
+# Query for Banner's class search listing (bwckschd.p_get_crse_unsec). Banner
+# expects every selector to be sent once as 'dummy' and once with a real value.
+SUBJECT_SEARCH_PARAMS = [
+    ('sel_subj', 'dummy'), ('sel_day', 'dummy'), ('sel_schd', 'dummy'),
+    ('sel_insm', 'dummy'), ('sel_camp', 'dummy'), ('sel_levl', 'dummy'),
+    ('sel_sess', 'dummy'), ('sel_instr', 'dummy'), ('sel_ptrm', 'dummy'),
+    ('sel_attr', 'dummy'), ('sel_crse', ''), ('sel_title', ''),
+    ('sel_schd', '%'), ('sel_insm', '%'), ('sel_from_cred', ''),
+    ('sel_to_cred', ''), ('sel_camp', '%'), ('sel_levl', '%'),
+    ('sel_ptrm', '%'), ('sel_instr', '%'), ('sel_attr', '%'),
+    ('begin_hh', '0'), ('begin_mi', '0'), ('begin_ap', 'a'),
+    ('end_hh', '0'), ('end_mi', '0'), ('end_ap', 'a'),
+]
+
+async def fetch_course_data(session, limiter, retry, term, subject, course_number, cache=None, sink=None,
+                            base_url=BASE_URL):
+    url = f"{base_url}/bwckctlg.p_disp_listcrse?term_in={term}&subj_in={subject}&crse_in={course_number}&schd_in="
     headers = {
         'User-Agent': 'Mozilla/5.0'  # Generic User-Agent
     }
-    async with sem:
-        for attempt in range(3):  # Retry up to 3 times
-            try:
-                async with session.get(url, headers=headers, timeout=10) as response:
-                    response.raise_for_status()  # Raise exception for HTTP errors
-                    html_content = await response.text()
-                    return html_content
-            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-                wait_time = 2 ** attempt
-                print(f"Attempt {attempt + 1} failed for {subject} {course_number}: {e}. Retrying in {wait_time} seconds...")
-                await asyncio.sleep(wait_time)
-        print(f"Failed to fetch data for {subject} {course_number} after 3 attempts.")
-        return None
-
-def parse_html(html_content, term, subject, course_number):
-    soup = BeautifulSoup(html_content, 'html.parser')
-    sections = soup.find_all('th', class_='ddtitle')
-    
-    courses = []
-    for section in sections:
-        course_info = {
-            'term': term,
-            'subject': subject,
-            'course_name': '',
-            'course_number': course_number,
-            'crn': '',
-            'section': '',
-            'frequency': '',
-            'time': '',
-            'days': '',
-            'location': '',
-            'date_range': '',
-            'schedule_type': '',
-            'instructor': '',
-            'instructional_method': '',
-            'units': '',
-            'additional_information': ''
-        }
-        
-        # Extract course name, CRN, and section
-        title = section.find('a').text.strip()
-        title_parts = title.split(' - ')
-        if len(title_parts) >= 3:
-            course_info['course_name'] = title_parts[0].strip()
-            course_info['crn'] = title_parts[1].strip()
-            course_info['section'] = title_parts[2].strip()
-        else:
-            print(f"Unexpected title format: {title}")
-            continue  # Skip this course if the format is unexpected
-
-        details = section.find_next('td', class_='dddefault')
-        if not details:
-            continue  # No details found
-
-        # Extract detailed text
-        detail_text = details.get_text('\n').strip()
-        lines = [line.strip() for line in detail_text.split('\n') if line.strip()]
-
-        # Extract units (Credits)
-        units_regex = re.compile(r'^(\d+\.\d+)\s*Credits$')
-        for line in lines:
-            units_match = units_regex.match(line)
-            if units_match:
-                course_info['units'] = units_match.group(1)
-                break
-
-        # Extract instructional method
-        method_regex = re.compile(r'^(.*)\s+Instructional Method$')
-        for line in lines:
-            method_match = method_regex.match(line)
-            if method_match:
-                course_info['instructional_method'] = method_match.group(1)
-                break
-
-        # Extract additional information
-        try:
-            associated_term_index = lines.index('Associated Term:')
-            potential_add_info = lines[:associated_term_index]
-            # Remove the course name from potential additional information
-            potential_add_info = [line for line in potential_add_info if line != course_info['course_name']]
-            if potential_add_info:
-                course_info['additional_information'] = ' '.join(potential_add_info)
-        except ValueError:
-            # 'Associated Term:' not found
-            pass
-
-        # Extract schedule details
-        table = details.find('table', class_='datadisplaytable')
-        if table:
-            rows = table.find_all('tr')[1:]  # Skip header row
-            for row in rows:
-                cols = row.find_all('td')
-                if len(cols) >= 7:
-                    course_info['frequency'] = cols[0].get_text(strip=True)
-                    course_info['time'] = cols[1].get_text(strip=True)
-                    course_info['days'] = cols[2].get_text(strip=True)
-                    course_info['location'] = cols[3].get_text(strip=True)
-                    course_info['date_range'] = cols[4].get_text(strip=True)
-                    course_info['schedule_type'] = cols[5].get_text(strip=True)
-                    course_info['instructor'] = cols[6].get_text(strip=True)
-                    break  # Assuming one schedule per course
-        
-        courses.append(course_info)
-    
-    return courses
-
-def save_to_csv(courses, filename):
-    fieldnames = [
-        'term', 'subject', 'course_name', 'course_number', 'crn', 'section',
-        'frequency', 'time', 'days', 'location', 'date_range', 'schedule_type',
-        'instructor', 'instructional_method', 'units', 'additional_information'
-    ]
-    
-    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        for course in courses:
-            writer.writerow(course)
+    logger.debug("Fetching data for %s %s in term %s...", subject, course_number, term)
+    # Each attempt takes a limiter slot only while its request is in flight;
+    # backoff between attempts happens in the retry scheduler without one.
+    html_content = await retry.run(
+        url,
+        lambda: fetch_cached(session, cache, url, headers=headers, timeout=10, limiter=limiter, sink=sink),
+        f"{subject} {course_number} in term {term}"
+    )
+    if html_content is not None:
+        logger.debug("Successfully fetched data for %s %s in term %s.", subject, course_number, term)
+    return html_content
+
+def subject_search_url(term, subject, base_url=BASE_URL):
+    params = [('term_in', term)] + SUBJECT_SEARCH_PARAMS + [('sel_subj', subject)]
+    return f"{base_url}/bwckschd.p_get_crse_unsec?{urlencode(params)}"
+
+async def fetch_subject_data(session, limiter, retry, term, subject, cache=None, sink=None, base_url=BASE_URL):
+    url = subject_search_url(term, subject, base_url)
+    headers = {
+        'User-Agent': 'Mozilla/5.0'  # Generic User-Agent
+    }
+    logger.debug("Fetching the %s listing in term %s...", subject, term)
+    html_content = await retry.run(
+        url,
+        lambda: fetch_cached(session, cache, url, headers=headers, timeout=30, limiter=limiter, sink=sink),
+        f"{subject} listing in term {term}"
+    )
+    if html_content is not None:
+        logger.debug("Successfully fetched the %s listing in term %s.", subject, term)
+    return html_content
 
-async def main():
+def iter_jobs(mode, terms, courses_list, done):
+    # Generated lazily so the work queue never holds more than its bound.
+    # Courses already in the journal (keyed term, subject, course_number) are skipped.
+    if mode == 'subject':
+        # One listing request per term/subject instead of one per course
+        subjects = {}
+        for course in courses_list:
+            subjects.setdefault(course['Subject'], []).append(course['Course Number'])
+        for term in terms:
+            for subject, course_numbers in subjects.items():
+                remaining = [number for number in course_numbers if (term, subject, number) not in done]
+                if remaining:
+                    yield term, subject, remaining
+    else:
+        for term in terms:
+            for course in courses_list:
+                if (term, course['Subject'], course['Course Number']) not in done:
+                    yield term, course['Subject'], course['Course Number']
+
+async def main(mode='subject', cache=None, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+               journal_path='scraped_course_data.journal', resume=False,
+               parse_workers=DEFAULT_PARSE_WORKERS, parser_backend=DEFAULT_PARSER,
+               base_url=BASE_URL, courses_path='courses-list-test.csv', output='scraped_course_data.csv',
+               metrics_port=None, trace_path=None, profile_path=None, parquet_path=None,
+               sqlite_path=None):
     start_time = time.time()
-    terms = ['202409', '202501']
-    all_courses = []
+    if trace_path:
+        start_trace(trace_path)
+    metrics_server = await serve_metrics(METRICS, metrics_port) if metrics_port else None
+    if metrics_server:
+        logger.info("Serving metrics on http://127.0.0.1:%d/metrics", metrics_port)
+    terms = TERMS
     
     # Read the courses-list.csv file
-    with open('courses-list-test.csv', 'r', encoding='utf-8') as csvfile:
+    with open(courses_path, 'r', encoding='utf-8') as csvfile:
         reader = csv.DictReader(csvfile)
         courses_list = list(reader)
     
-    sem = asyncio.Semaphore(CONCURRENT_REQUESTS)
+    limiter = AdaptiveLimiter(CONCURRENT_REQUESTS, maximum=max_concurrency)
+    retry = RetryScheduler()
+    # Rows are appended as they complete, so a crash keeps everything so far.
+    # The journal records which courses are finished so --resume can skip them.
+    journal = Journal(journal_path, resume=resume)
+    writer = CsvStreamWriter(output, SECTION_FIELDS)
+    writers = [writer]
+    if parquet_path:
+        # The same rows typed and dictionary encoded, one row group at a time
+        writers.append(ParquetStreamWriter(parquet_path, SECTION_COLUMNS))
+    store = SqliteStore(sqlite_path) if sqlite_path else None
+    if store:
+        # Upserted on (term, crn), so a rerun updates the rows in place
+        writers.append(store.writer('sections'))
+    replayed = list(journal.replay())
+    for each in writers:
+        each.write(replayed)
+    if journal.done:
+        logger.info("Resuming: %d courses already scraped.", len(journal.done))
+
+    def write(results):
+        for key, rows in results:
+            for each in writers:
+                each.write(rows)
+            journal.record(key, [list(row) for row in rows])
+            logger.debug("Completed %s %s in term %s: %d sections.", key[1], key[2], key[0], len(rows))
     
-    async with aiohttp.ClientSession() as session:
-        tasks = []
-        for term in terms:
-            for course in courses_list:
-                subject = course['Subject']
-                course_number = course['Course Number']
-                
-                tasks.append(
-                    fetch_and_parse_course(session, sem, term, subject, course_number)
-                )
-        
-        # Process tasks concurrently
-        results = await asyncio.gather(*tasks)
-
-        for courses in results:
-            if courses:
-                all_courses.extend(courses)
+    # Pages are parsed in worker processes so the loop keeps reading responses
+    parse_stage = ParseStage(parse_workers, backend=parser_backend, profile_path=profile_path)
     
-    # Save all the scraped data to a new CSV file
-    save_to_csv(all_courses, 'scraped_course_data.csv')
-    print("Data has been scraped and saved to scraped_course_data.csv")
+    # The trace hooks split each request into pool wait, connect and time to first byte
+    async with aiohttp.ClientSession(trace_configs=[trace_config()]) as session:
+        async def handle(job):
+            term, subject, course = job
+            if mode == 'subject':
+                return await fetch_and_parse_subject(session, limiter, retry, parse_stage, term, subject, course,
+                                                     cache, base_url)
+            courses = await fetch_and_parse_course(session, limiter, retry, parse_stage, term, subject, course,
+                                                   cache, base_url)
+            return [] if courses is None else [((term, subject, course), courses)]
+
+        # One worker per possible slot; the limiter decides how many request at once
+        try:
+            await run_pipeline(iter_jobs(mode, terms, courses_list, journal.done), handle, write, workers=max_concurrency)
+        finally:
+            for each in writers:
+                each.close()
+            if store:
+                store.close()
+            journal.close()
+            parse_stage.close()
+            stop_trace()
+            if metrics_server:
+                await metrics_server.cleanup()
+    
+    logger.info("%d sections have been scraped and saved to %s", writer.rows_written, output)
+    logger.info(limiter.summary())
+    logger.info(retry.summary())
+    logger.info(stage_summary())
+    if cache:
+        logger.info(cache.summary())
+        cache.close()
     end_time = time.time()
     total_time = end_time - start_time
     hours, rem = divmod(total_time, 3600)
     minutes, seconds = divmod(rem, 60)
-    print("Script execution time: {:0>2}:{:0>2}:{:05.2f}".format(int(hours), int(minutes), seconds))
+    logger.info("Script execution time: {:0>2}:{:0>2}:{:05.2f}".format(int(hours), int(minutes), seconds))
 
-async def fetch_and_parse_course(session, sem, term, subject, course_number):
-    html_content = await fetch_course_data(session, sem, term, subject, course_number)
-    if html_content:
-        courses = parse_html(html_content, term, subject, course_number)
-        return courses
-    else:
-        return []
+def rows_to_courses(rows):
+    # Rebuilt from the workers' tuples; repeated values go through the intern table
+    return [SectionRow(*row) for row in rows]
+
+async def fetch_and_parse_course(session, limiter, retry, parse_stage, term, subject, course_number, cache=None,
+                                 base_url=BASE_URL, on_section=None):
+    # With the stream backend on_section is given each section as soon as
+    # it is parsed, before the page has finished downloading
+    with request_spans(f"{subject} {course_number} in term {term}"):
+        if parse_stage.backend == 'stream':
+            # Parsed on the loop while the body downloads, no worker round trip
+            stream = SectionStreamParser(term, subject, course_number, on_section)
+            if await fetch_course_data(session, limiter, retry, term, subject, course_number, cache, stream,
+                                       base_url) is None:
+                return None
+            courses = stream.close()
+            record_parse(stream.parse_seconds, 'stream')
+            return courses
+        html_content = await fetch_course_data(session, limiter, retry, term, subject, course_number, cache,
+                                               base_url=base_url)
+        if html_content is None:
+            return None  # fetch failed, as opposed to a course without sections
+        rows = await parse_stage.run(parse_html_rows, html_content, term, subject, course_number, parse_stage.backend)
+        return rows_to_courses(rows)
+
+async def fetch_and_parse_subject(session, limiter, retry, parse_stage, term, subject, course_numbers, cache=None,
+                                  base_url=BASE_URL, on_section=None):
+    # Returns ((term, subject, course_number), sections) for every course it could fetch.
+    # on_section sees every section of the listing, tracked or not, as it is parsed.
+    with request_spans(f"{subject} listing in term {term}"):
+        stream = SectionStreamParser(term, subject, on_section=on_section) if parse_stage.backend == 'stream' else None
+        html_content = await fetch_subject_data(session, limiter, retry, term, subject, cache, stream, base_url)
+        if html_content is None:
+            # Listing unavailable, fall back to one request per course
+            logger.warning("Falling back to per-course requests for %s in term %s.", subject, term)
+            results = await asyncio.gather(*[
+                fetch_and_parse_course(session, limiter, retry, parse_stage, term, subject, course_number, cache, base_url,
+                                       on_section)
+                for course_number in course_numbers
+            ])
+            return [
+                ((term, subject, course_number), courses)
+                for course_number, courses in zip(course_numbers, results) if courses is not None
+            ]
+        # The listing covers every course in the subject; keep the ones we track
+        by_number = {course_number: [] for course_number in course_numbers}
+        if stream:
+            courses = stream.close()
+            record_parse(stream.parse_seconds, 'stream')
+        else:
+            rows = await parse_stage.run(parse_html_rows, html_content, term, subject, None, parse_stage.backend)
+            courses = rows_to_courses(rows)
+        for course in courses:
+            if course['course_number'] in by_number:
+                by_number[course['course_number']].append(course)
+        return [((term, subject, course_number), courses) for course_number, courses in by_number.items()]
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Scrape UVIC class schedule sections from BAN1P.")
+    parser.add_argument('--mode', choices=['subject', 'course'], default='subject',
+                        help="'subject' fetches one listing per term/subject, 'course' one page per course")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="on-disk HTTP response cache shared by all scrapers")
+    parser.add_argument('--no-cache', action='store_true', help="always fetch full pages from the network")
+    parser.add_argument('--max-concurrency', type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help="upper bound for the adaptive number of in-flight requests")
+    parser.add_argument('--journal', default='scraped_course_data.journal',
+                        help="append-only log of finished courses used by --resume")
+    parser.add_argument('--resume', action='store_true',
+                        help="skip courses recorded in the journal and merge their rows into the output")
+    parser.add_argument('--parse-workers', type=int, default=DEFAULT_PARSE_WORKERS,
+                        help="processes used to parse pages (0 parses on the event loop)")
+    parser.add_argument('--parser', choices=sorted(SECTION_PARSERS), default=DEFAULT_PARSER,
+                        help="HTML parser backend (bs4 is the reference implementation, "
+                             "stream parses pages while they download)")
+    parser.add_argument('--base-url', default=BASE_URL,
+                        help="BAN1P root to scrape, e.g. a local stand-in server's http://127.0.0.1:8080/BAN1P")
+    parser.add_argument('--courses', default='courses-list-test.csv', help="CSV of subjects and course numbers to scrape")
+    parser.add_argument('--output', default='scraped_course_data.csv', help="CSV the sections are written to")
+    parser.add_argument('--parquet', help="also write the sections to this Parquet file (needs pyarrow)")
+    parser.add_argument('--sqlite', help="also upsert the sections into this SQLite database")
+    parser.add_argument('-v', '--verbose', action='count', default=0, help="log every request and finished course")
+    parser.add_argument('-q', '--quiet', action='store_true', help="only log warnings and errors")
+    parser.add_argument('--metrics', help="write request, retry, queue and parse metrics here at the end "
+                                          "(JSON for a .json file, Prometheus text otherwise)")
+    parser.add_argument('--metrics-port', type=int, help="serve live metrics on http://127.0.0.1:PORT/metrics")
+    parser.add_argument('--trace', help="write each page's time per stage (queue wait, connect, ttfb, body, "
+                                        "parse) to this file as JSON lines")
+    parser.add_argument('--profile', help="sample the parse workers and write a speedscope profile "
+                                          "(or folded stacks for a .folded file)")
+    args = parser.parse_args()
+    if args.parquet and not ParquetStreamWriter.available:
+        parser.error("--parquet needs pyarrow: pip install pyarrow")
+    setup_logging(-1 if args.quiet else args.verbose)
+    cache = None if args.no_cache else ResponseCache(args.cache_dir)
+    asyncio.run(main(args.mode, cache, args.max_concurrency, args.journal, args.resume,
+                     args.parse_workers, args.parser, args.base_url.rstrip('/'), args.courses, args.output,
+                     args.metrics_port, args.trace, args.profile, args.parquet, args.sqlite))
+    if args.metrics:
+        METRICS.write(args.metrics)
\ No newline at end of file
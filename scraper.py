@@ -1,15 +1,22 @@
 import time
 import csv
+import argparse
 import requests
 from bs4 import BeautifulSoup
 import random
 import re
-import msvcrt  # Import msvcrt for keyboard detection on Windows
+try:
+    import msvcrt  # Import msvcrt for keyboard detection on Windows
+except ImportError:  # Elsewhere there is no 'q' to stop early
+    msvcrt = None
 
 start_time = time.time()  # Record the start time
 
-def fetch_course_data(term, subject, course_number):
-    url = f"https://www.uvic.ca/BAN1P/bwckctlg.p_disp_listcrse?term_in={term}&subj_in={subject}&crse_in={course_number}&schd_in="
+# Overridden with --base-url to scrape a stand-in server instead
+BASE_URL = "https://www.uvic.ca/BAN1P"
+
+def fetch_course_data(term, subject, course_number, base_url=BASE_URL):
+    url = f"{base_url}/bwckctlg.p_disp_listcrse?term_in={term}&subj_in={subject}&crse_in={course_number}&schd_in="
     response = requests.get(url)
     return response.text
 
@@ -114,12 +121,12 @@ def save_to_csv(courses, filename):
         for course in courses:
             writer.writerow(course)
 
-def main():
+def main(base_url=BASE_URL, courses_path='courses-list.csv', output='scraped_course_data.csv'):
     terms = ['202409', '202501']
     all_courses = []
 
     # Read the courses-list.csv file
-    with open('courses-list.csv', 'r', encoding='utf-8') as csvfile:
+    with open(courses_path, 'r', encoding='utf-8') as csvfile:
         reader = csv.DictReader(csvfile)
         courses_list = list(reader)
 
@@ -134,7 +141,7 @@ def main():
 
             print(f"Fetching data for {subject} {course_number} in term {term}")
 
-            html_content = fetch_course_data(term, subject, course_number)
+            html_content = fetch_course_data(term, subject, course_number, base_url)
             courses = parse_html(html_content, term, subject, course_number)
             all_courses.extend(courses)
 
@@ -142,7 +149,7 @@ def main():
             time.sleep(random.uniform(1, 3))
 
             # Check if 'q' has been pressed
-            if msvcrt.kbhit():
+            if msvcrt and msvcrt.kbhit():
                 key = msvcrt.getch()
                 if key.lower() == b'q':
                     print("Stopping scraping as per user request.")
@@ -153,11 +160,17 @@ def main():
             break
 
     # Save all the scraped data to a new CSV file
-    save_to_csv(all_courses, 'scraped_course_data.csv')
-    print("Data has been scraped and saved to scraped_course_data.csv")
+    save_to_csv(all_courses, output)
+    print(f"Data has been scraped and saved to {output}")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Scrape UVIC class schedule sections from BAN1P, one course at a time.")
+    parser.add_argument('--base-url', default=BASE_URL,
+                        help="BAN1P root to scrape, e.g. a local stand-in server's http://127.0.0.1:8080/BAN1P")
+    parser.add_argument('--courses', default='courses-list.csv', help="CSV of subjects and course numbers to scrape")
+    parser.add_argument('--output', default='scraped_course_data.csv', help="CSV the sections are written to")
+    args = parser.parse_args()
+    main(args.base_url.rstrip('/'), args.courses, args.output)
     end_time = time.time()  # Record the end time
     total_time = end_time - start_time  # Calculate the total execution time in seconds
 
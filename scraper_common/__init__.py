@@ -0,0 +1 @@
+# Helpers shared by the BAN1P and Kuali scrapers
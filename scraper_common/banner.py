@@ -0,0 +1,500 @@
+import codecs
+import logging
+import re
+import time
+from html.parser import HTMLParser
+from bs4 import BeautifulSoup
+
+from scraper_common.records import SECTION_FIELDS, SectionRow
+
+try:
+    from lxml import html as lxml_html
+except ImportError:  # lxml is optional, BeautifulSoup is the reference backend
+    lxml_html = None
+
+logger = logging.getLogger(__name__)
+
+# Column order of course_capacity_data.csv
+SEAT_FIELDS = [
+    'term', 'crn', 'Seats_Capacity', 'Seats_Actual', 'Seats_Remaining',
+    'Waitlist_Capacity', 'Waitlist_Actual', 'Waitlist_Remaining'
+]
+
+UNITS_REGEX = re.compile(r'^(\d+\.\d+)\s*Credits$')
+METHOD_REGEX = re.compile(r'^(.*)\s+Instructional Method$')
+CHARSET_REGEX = re.compile(rb'<meta[^>]+charset=["\']?([-\w]+)', re.IGNORECASE)
+
+# Backend independent field extraction, shared by every parser below
+
+def new_section(term, subject, course_number):
+    # Every other field starts out empty
+    return SectionRow(term, subject, '', course_number)
+
+def apply_title(course_info, title, course_number):
+    # Extract course name, CRN, and section; False if the format is unexpected
+    title_parts = title.split(' - ')
+    if len(title_parts) < 3:
+        logger.warning("Unexpected title format: %s", title)
+        return False
+    course_info['course_name'] = title_parts[0].strip()
+    course_info['crn'] = title_parts[1].strip()
+    course_info['section'] = title_parts[2].strip()
+    if course_number is None:
+        course_info['course_number'] = title_parts[2].strip().split(' ')[-1]
+    return True
+
+def apply_detail_lines(course_info, lines):
+    # Extract units (Credits)
+    for line in lines:
+        units_match = UNITS_REGEX.match(line)
+        if units_match:
+            course_info['units'] = units_match.group(1)
+            break
+
+    # Extract instructional method
+    for line in lines:
+        method_match = METHOD_REGEX.match(line)
+        if method_match:
+            course_info['instructional_method'] = method_match.group(1)
+            break
+
+    # Extract additional information
+    try:
+        associated_term_index = lines.index('Associated Term:')
+        potential_add_info = lines[:associated_term_index]
+        # Remove the course name from potential additional information
+        potential_add_info = [line for line in potential_add_info if line != course_info['course_name']]
+        if potential_add_info:
+            course_info['additional_information'] = ' '.join(potential_add_info)
+    except ValueError:
+        # 'Associated Term:' not found
+        pass
+
+def apply_schedule(course_info, cols):
+    course_info['frequency'] = cols[0]
+    course_info['time'] = cols[1]
+    course_info['days'] = cols[2]
+    course_info['location'] = cols[3]
+    course_info['date_range'] = cols[4]
+    course_info['schedule_type'] = cols[5]
+    course_info['instructor'] = cols[6]
+
+def new_seats(term, crn):
+    return {
+        'term': term,
+        'crn': crn,
+        'Seats_Capacity': '',
+        'Seats_Actual': '',
+        'Seats_Remaining': '',
+        'Waitlist_Capacity': '',
+        'Waitlist_Actual': '',
+        'Waitlist_Remaining': ''
+    }
+
+def apply_seat_row(course_info, label, capacity, actual, remaining):
+    if label == 'Seats':
+        course_info['Seats_Capacity'] = capacity
+        course_info['Seats_Actual'] = actual
+        course_info['Seats_Remaining'] = remaining
+    elif label == 'Waitlist Seats':
+        course_info['Waitlist_Capacity'] = capacity
+        course_info['Waitlist_Actual'] = actual
+        course_info['Waitlist_Remaining'] = remaining
+
+def decode_page(html_content):
+    # Same order BeautifulSoup tries: declared charset, then UTF-8, then cp1252
+    if isinstance(html_content, str):
+        return html_content
+    declared = CHARSET_REGEX.search(html_content[:2048])
+    for encoding in ([declared.group(1).decode('ascii')] if declared else []) + ['utf-8']:
+        try:
+            return html_content.decode(encoding)
+        except (LookupError, UnicodeDecodeError):
+            pass
+    return html_content.decode('windows-1252', errors='replace')
+
+# BeautifulSoup backend, the reference implementation
+
+def parse_html(html_content, term, subject, course_number=None):
+    # course_number=None parses a whole-subject listing; each section's number
+    # is then read from the 'SUBJ NUM' part of its title.
+    soup = BeautifulSoup(html_content, 'html.parser')
+    sections = soup.find_all('th', class_='ddtitle')
+    
+    courses = []
+    for section in sections:
+        course_info = new_section(term, subject, course_number)
+        
+        title = section.find('a').text.strip()
+        if not apply_title(course_info, title, course_number):
+            continue  # Skip this course if the format is unexpected
+
+        details = section.find_next('td', class_='dddefault')
+        if not details:
+            continue  # No details found
+
+        # Extract detailed text
+        detail_text = details.get_text('\n').strip()
+        lines = [line.strip() for line in detail_text.split('\n') if line.strip()]
+        apply_detail_lines(course_info, lines)
+
+        # Extract schedule details
+        table = details.find('table', class_='datadisplaytable')
+        if table:
+            rows = table.find_all('tr')[1:]  # Skip header row
+            for row in rows:
+                cols = row.find_all('td')
+                if len(cols) >= 7:
+                    apply_schedule(course_info, [col.get_text(strip=True) for col in cols[:7]])
+                    break  # Assuming one schedule per course
+        
+        courses.append(course_info)
+    
+    return courses
+
+def parse_details_html(html_content, term, crn):
+    soup = BeautifulSoup(html_content, 'html.parser')
+
+    course_info = new_seats(term, crn)
+
+    # Find the table with caption "Registration Availability"
+    tables = soup.find_all('table', class_='datadisplaytable')
+    reg_table = None
+    for table in tables:
+        caption = table.find('caption', class_='captiontext')
+        if caption and 'Registration Availability' in caption.text:
+            reg_table = table
+            break
+
+    if reg_table is None:
+        logger.warning("No 'Registration Availability' table found for term %s, CRN %s.", term, crn)
+        return None
+
+    # Now parse the rows in reg_table
+    rows = reg_table.find_all('tr')
+    data_rows = rows[1:]  # Skip the header row
+
+    for row in data_rows:
+        headers = row.find_all('th')
+        cells = row.find_all('td')
+        if headers and len(headers) >= 1 and len(cells) >= 3:
+            apply_seat_row(course_info, headers[0].get_text(strip=True),
+                           *[cell.get_text(strip=True) for cell in cells[:3]])
+
+    return course_info
+
+# lxml backend: the same traversal as XPath over libxml2's tree
+
+def has_class(name):
+    return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+SECTIONS_XPATH = f'//th[{has_class("ddtitle")}]'
+DETAILS_XPATH = f'(descendant::td[{has_class("dddefault")}] | following::td[{has_class("dddefault")}])[1]'
+SCHEDULE_XPATH = f'descendant::table[{has_class("datadisplaytable")}][1]'
+DATA_TABLES_XPATH = f'//table[{has_class("datadisplaytable")}]'
+CAPTION_XPATH = f'descendant::caption[{has_class("captiontext")}][1]'
+TEXT_XPATH = 'descendant::text()[not(parent::script or parent::style)]'
+
+def lxml_text(element, strip=False):
+    strings = element.xpath(TEXT_XPATH)
+    if strip:
+        return ''.join(string.strip() for string in strings)
+    return ''.join(strings)
+
+def parse_html_lxml(html_content, term, subject, course_number=None):
+    document = lxml_html.fromstring(decode_page(html_content))
+
+    courses = []
+    for section in document.xpath(SECTIONS_XPATH):
+        course_info = new_section(term, subject, course_number)
+
+        title = lxml_text(section.xpath('descendant::a[1]')[0]).strip()
+        if not apply_title(course_info, title, course_number):
+            continue
+
+        details = section.xpath(DETAILS_XPATH)
+        if not details:
+            continue
+        details = details[0]
+
+        lines = [line.strip() for string in details.xpath(TEXT_XPATH)
+                 for line in string.split('\n') if line.strip()]
+        apply_detail_lines(course_info, lines)
+
+        for table in details.xpath(SCHEDULE_XPATH):
+            for row in table.xpath('descendant::tr')[1:]:
+                cols = row.xpath('descendant::td')
+                if len(cols) >= 7:
+                    apply_schedule(course_info, [lxml_text(col, strip=True) for col in cols[:7]])
+                    break
+
+        courses.append(course_info)
+
+    return courses
+
+def parse_details_html_lxml(html_content, term, crn):
+    document = lxml_html.fromstring(decode_page(html_content))
+
+    course_info = new_seats(term, crn)
+
+    reg_table = None
+    for table in document.xpath(DATA_TABLES_XPATH):
+        caption = table.xpath(CAPTION_XPATH)
+        if caption and 'Registration Availability' in lxml_text(caption[0]):
+            reg_table = table
+            break
+
+    if reg_table is None:
+        logger.warning("No 'Registration Availability' table found for term %s, CRN %s.", term, crn)
+        return None
+
+    for row in reg_table.xpath('descendant::tr')[1:]:
+        headers = row.xpath('descendant::th')
+        cells = row.xpath('descendant::td')
+        if headers and len(cells) >= 3:
+            apply_seat_row(course_info, lxml_text(headers[0], strip=True),
+                           *[lxml_text(cell, strip=True) for cell in cells[:3]])
+
+    return course_info
+
+# Streaming backend: an event-driven html.parser that builds no tree and
+# emits each section as soon as its details cell closes, so it can be fed
+# response chunks while the page is still downloading.
+
+# Tags BeautifulSoup closes immediately, and tags whose text get_text() skips
+VOID_TAGS = {
+    'area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed', 'frame',
+    'hr', 'image', 'img', 'input', 'isindex', 'keygen', 'link', 'menuitem', 'meta',
+    'nextid', 'param', 'source', 'spacer', 'track', 'wbr'
+}
+SKIPPED_TEXT_TAGS = {'script', 'style', 'template'}
+
+class _OpenTag:
+    __slots__ = ('name', 'on_close')
+
+    def __init__(self, name, on_close=None):
+        self.name = name
+        self.on_close = on_close
+
+class SectionStreamParser(HTMLParser):
+    """Incremental equivalent of parse_html.
+
+    Call feed() with text or bytes as it arrives and close() at the end.
+    Sections are passed to on_section as soon as they are complete, and
+    also collected in self.sections. parse_seconds totals the time spent
+    inside feed() and close().
+    """
+
+    def __init__(self, term, subject, course_number=None, on_section=None):
+        self.term = term
+        self.subject = subject
+        self.course_number = course_number
+        self.on_section = on_section
+        super().__init__(convert_charrefs=True)
+
+    def reset(self):
+        # Also called by fetch_cached before each attempt, so a retried
+        # download starts from a clean parser
+        super().reset()
+        self.sections = []
+        self.parse_seconds = 0.0
+        self._decoder = None
+        # Mirrors BeautifulSoup's tree: end tags close back to the most
+        # recent open tag of the same name, void tags are never opened.
+        self._stack = []
+        self._skip_text = 0
+        self._text = []
+        self._title_parts = None   # text of the current th.ddtitle's first <a>
+        self._in_title_link = False
+        self._awaiting = []        # titles still waiting for their details cell
+        self._lines = None         # detail lines of the open details cell
+        self._details_for = None
+        self._schedule_seen = False
+        self._schedule = None
+        self._rows = None          # column texts per <tr> of the schedule table
+        self._open_rows = []
+        self._open_cols = []
+
+    def feed(self, data):
+        start = time.perf_counter()
+        if isinstance(data, bytes):
+            if self._decoder is None:
+                declared = CHARSET_REGEX.search(data[:2048])
+                encoding = declared.group(1).decode('ascii') if declared else 'utf-8'
+                try:
+                    self._decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+                except LookupError:
+                    self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            data = self._decoder.decode(data)
+        super().feed(data)
+        self.parse_seconds += time.perf_counter() - start
+
+    def close(self):
+        start = time.perf_counter()
+        if self._decoder is not None:
+            super().feed(self._decoder.decode(b'', final=True))
+        super().close()
+        self._flush_text()
+        self.parse_seconds += time.perf_counter() - start
+        return self.sections
+
+    def handle_starttag(self, tag, attrs):
+        self._flush_text()
+        if tag in VOID_TAGS:
+            return
+        classes = ()
+        for name, value in attrs:
+            if name == 'class' and value:
+                classes = value.split()
+        on_close = None
+        if tag == 'th' and 'ddtitle' in classes:
+            self._title_parts = None
+            self._awaiting.append(None)
+            on_close = self._close_title
+        elif tag == 'a' and self._awaiting and self._awaiting[-1] is None and self._title_parts is None:
+            self._title_parts = []
+            self._in_title_link = True
+            on_close = self._close_title_link
+        elif tag == 'td' and 'dddefault' in classes and self._awaiting and self._lines is None:
+            self._lines = []
+            self._details_for = self._awaiting
+            self._awaiting = []
+            self._schedule_seen = False
+            on_close = self._close_details
+        elif tag == 'table' and 'datadisplaytable' in classes and self._lines is not None and not self._schedule_seen:
+            self._schedule_seen = True
+            self._rows = []
+            on_close = self._close_schedule
+        elif tag == 'tr' and self._rows is not None:
+            row = []
+            self._rows.append(row)
+            self._open_rows.append(row)
+            on_close = self._close_row
+        elif tag == 'td' and self._open_rows:
+            col = []
+            for row in self._open_rows:
+                row.append(col)
+            self._open_cols.append(col)
+            on_close = self._close_col
+        elif tag in SKIPPED_TEXT_TAGS:
+            self._skip_text += 1
+            on_close = self._close_skipped
+        self._stack.append(_OpenTag(tag, on_close))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        self._flush_text()
+        for index in range(len(self._stack) - 1, -1, -1):
+            if self._stack[index].name == tag:
+                break
+        else:
+            return  # nothing to close, as BeautifulSoup ignores it too
+        while len(self._stack) > index:
+            open_tag = self._stack.pop()
+            if open_tag.on_close:
+                open_tag.on_close()
+
+    def handle_data(self, data):
+        # html.parser may split one text run across feed() chunks, while
+        # BeautifulSoup sees it as one string, so buffer until the next tag
+        if not self._skip_text:
+            self._text.append(data)
+
+    def _flush_text(self):
+        if not self._text:
+            return
+        data = ''.join(self._text)
+        self._text = []
+        if self._in_title_link:
+            self._title_parts.append(data)
+        if self._lines is not None:
+            self._lines.extend(line.strip() for line in data.split('\n') if line.strip())
+        if self._open_cols:
+            stripped = data.strip()
+            if stripped:
+                for col in self._open_cols:
+                    col.append(stripped)
+
+    def handle_comment(self, data):
+        self._flush_text()
+
+    handle_decl = handle_pi = unknown_decl = handle_comment
+
+    def _close_title_link(self):
+        self._in_title_link = False
+
+    def _close_title(self):
+        # Replace the placeholder with this title's text ('' without a link)
+        self._awaiting[-1] = ''.join(self._title_parts or []).strip()
+        self._title_parts = None
+
+    def _close_row(self):
+        self._open_rows.pop()
+
+    def _close_col(self):
+        self._open_cols.pop()
+
+    def _close_schedule(self):
+        self._schedule = self._rows
+        self._rows = None
+        self._open_rows = []
+        self._open_cols = []
+
+    def _close_skipped(self):
+        self._skip_text -= 1
+
+    def _close_details(self):
+        lines = self._lines
+        schedule = self._schedule if self._schedule_seen else None
+        if self._rows is not None:  # details closed before its schedule table
+            schedule = self._rows
+            self._rows = None
+            self._open_rows = []
+            self._open_cols = []
+        self._lines = None
+        self._schedule = None
+        for title in self._details_for:
+            course_info = new_section(self.term, self.subject, self.course_number)
+            if title is None or not apply_title(course_info, title, self.course_number):
+                continue
+            apply_detail_lines(course_info, lines)
+            for row in (schedule or [])[1:]:  # Skip header row
+                if len(row) >= 7:
+                    apply_schedule(course_info, [''.join(col) for col in row[:7]])
+                    break
+            self.sections.append(course_info)
+            if self.on_section:
+                self.on_section(course_info)
+        self._details_for = None
+
+STREAM_CHUNK_SIZE = 8192
+
+def parse_html_stream(html_content, term, subject, course_number=None):
+    # Whole-page entry point, fed in network-sized chunks
+    parser = SectionStreamParser(term, subject, course_number)
+    for start in range(0, len(html_content), STREAM_CHUNK_SIZE):
+        parser.feed(html_content[start:start + STREAM_CHUNK_SIZE])
+    return parser.close()
+
+SECTION_PARSERS = {'bs4': parse_html, 'stream': parse_html_stream}
+SEAT_PARSERS = {'bs4': parse_details_html}
+if lxml_html is not None:
+    SECTION_PARSERS['lxml'] = parse_html_lxml
+    SEAT_PARSERS['lxml'] = parse_details_html_lxml
+DEFAULT_PARSER = 'lxml' if lxml_html is not None else 'bs4'
+
+# Process pool entry points: raw page bytes in, plain tuples out, which are
+# much cheaper to pickle back to the event loop than dicts. Interned values
+# are pickled once per page; SectionRow(*row) interns them again on arrival.
+
+def parse_html_rows(html_content, term, subject, course_number=None, backend='bs4'):
+    return [tuple(course)
+            for course in SECTION_PARSERS[backend](html_content, term, subject, course_number)]
+
+def parse_details_row(html_content, term, crn, backend='bs4'):
+    course_info = SEAT_PARSERS[backend](html_content, term, crn)
+    return tuple(course_info[field] for field in SEAT_FIELDS) if course_info else None
@@ -0,0 +1,114 @@
+import importlib.util
+import logging
+from decimal import Decimal, InvalidOperation
+
+from scraper_common.records import SECTION_FIELDS, INTERNED_FIELDS
+from scraper_common.banner import SEAT_FIELDS
+
+logger = logging.getLogger(__name__)
+
+ROW_GROUP_SIZE = 5000  # rows buffered per Parquet row group
+COMPRESSION = 'zstd'
+
+# Column kinds: 'dictionary' for repeated strings, 'string', 'int32' and
+# 'decimal' (three places, as BAN1P prints credit units). Values that do
+# not convert to a typed column are stored as null.
+SECTION_COLUMNS = [
+    (field, 'int32' if field == 'crn' else 'decimal' if field == 'units'
+     else 'dictionary' if field in INTERNED_FIELDS else 'string')
+    for field in SECTION_FIELDS
+]
+SEAT_COLUMNS = [('term', 'dictionary'), ('crn', 'int32')] + [
+    (field, 'int32') for field in SEAT_FIELDS[2:]
+]
+
+
+def arrow_type(kind):
+    import pyarrow as pa
+    return {
+        'dictionary': pa.dictionary(pa.int32(), pa.string()),
+        'string': pa.string(),
+        'int32': pa.int32(),
+        'decimal': pa.decimal128(9, 3),
+    }[kind]
+
+
+def convert(kind, value):
+    # The Python value stored for one CSV field, None when it does not fit
+    if kind in ('dictionary', 'string'):
+        return value
+    value = value.strip() if isinstance(value, str) else value
+    if value in ('', None):
+        return None
+    try:
+        if kind == 'int32':
+            return int(value)
+        return Decimal(value).quantize(Decimal('0.001'))
+    except (ValueError, InvalidOperation):
+        raise ValueError(value) from None
+
+
+class ParquetStreamWriter:
+    """Appends rows to a Parquet file in row groups, like CsvStreamWriter.
+
+    Rows are dicts or sequences in column order. Repeated strings are
+    dictionary encoded and CRNs, units and seat counts are typed, so a
+    reader can load just the columns it needs (memory-mapped, without
+    re-parsing strings). Every row_group_size rows become one row group.
+    """
+
+    # pyarrow is optional, only Parquet output needs it. It is imported when
+    # a file is opened, importing it adds a sixth of a second to every run.
+    available = importlib.util.find_spec('pyarrow') is not None
+
+    def __init__(self, filename, columns, row_group_size=ROW_GROUP_SIZE):
+        if not self.available:
+            raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow).")
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa = pa
+        self.filename = filename
+        self.columns = columns
+        self.row_group_size = row_group_size
+        self.rows_written = 0
+        self.invalid = 0  # typed values stored as null
+        self._names = [name for name, _ in columns]
+        self._kinds = [kind for _, kind in columns]
+        self._buffers = [[] for _ in columns]
+        self._schema = pa.schema([(name, arrow_type(kind)) for name, kind in columns])
+        self._writer = pq.ParquetWriter(
+            filename, self._schema, compression=COMPRESSION,
+            use_dictionary=[name for name, kind in columns if kind == 'dictionary'])
+
+    def write(self, rows):
+        for row in rows:
+            values = [row.get(name, '') for name in self._names] if isinstance(row, dict) else row
+            for buffer, kind, value in zip(self._buffers, self._kinds, values):
+                try:
+                    buffer.append(convert(kind, value))
+                except ValueError:
+                    buffer.append(None)
+                    self.invalid += 1
+            if len(self._buffers[0]) >= self.row_group_size:
+                self.flush()
+
+    def flush(self):
+        if not self._buffers[0]:
+            return
+        pa = self._pa
+        arrays = []
+        for buffer, kind in zip(self._buffers, self._kinds):
+            if kind == 'dictionary':
+                arrays.append(pa.array(buffer, pa.string()).dictionary_encode())
+            else:
+                arrays.append(pa.array(buffer, arrow_type(kind)))
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema))
+        self.rows_written += len(self._buffers[0])
+        self._buffers = [[] for _ in self.columns]
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+        if self.invalid:
+            logger.warning("%d values in %s did not fit their column type and were stored as null.",
+                           self.invalid, self.filename)
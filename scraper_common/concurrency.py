@@ -0,0 +1,133 @@
+import asyncio
+import collections
+import time
+
+import aiohttp
+
+from scraper_common.tracing import record_stage
+
+# AIMD tuning: grow by one slot per healthy window, halve on trouble
+DEFAULT_MIN_CONCURRENCY = 1
+DEFAULT_MAX_CONCURRENCY = 40
+WINDOW = 20  # completed requests between adjustments
+ERROR_THRESHOLD = 0.05  # share of overload errors in a window that triggers a back-off
+OVERLOAD_STATUSES = (429, 502, 503, 504)
+LATENCY_FACTOR = 1.5  # back off when p95 exceeds the best seen p95 by this factor
+
+
+def is_overload_error(exc):
+    # Failed connections, timeouts and 429/502/503/504 mean the server is
+    # struggling. Other statuses are answers about the request itself, and
+    # a cancelled request or a page that failed to parse says nothing
+    # about the server's load.
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return exc.status in OVERLOAD_STATUSES
+    return isinstance(exc, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+class AIMDController:
+    """Additive-increase/multiplicative-decrease concurrency limit."""
+
+    def __init__(self, initial, minimum=DEFAULT_MIN_CONCURRENCY, maximum=DEFAULT_MAX_CONCURRENCY):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = max(minimum, min(initial, maximum))
+        self.peak = self.limit
+        self.baseline_p95 = None
+        self.adjustments = 0
+        self._latencies = []
+        self._failures = 0
+
+    def record(self, latency, failed):
+        self._latencies.append(latency)
+        if failed:
+            self._failures += 1
+        if len(self._latencies) >= WINDOW:
+            self._adjust()
+
+    def _adjust(self):
+        latencies = sorted(self._latencies)
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        error_rate = self._failures / len(latencies)
+        self._latencies = []
+        self._failures = 0
+        self.adjustments += 1
+
+        slow = self.baseline_p95 is not None and p95 > self.baseline_p95 * LATENCY_FACTOR
+        if error_rate > ERROR_THRESHOLD or slow:
+            self.limit = max(self.minimum, int(self.limit * 0.5))
+        else:
+            self.limit = min(self.maximum, self.limit + 1)
+            self.peak = max(self.peak, self.limit)
+        # Track the best p95 seen, but let it drift up so a permanently slower
+        # server does not pin the limit at the minimum.
+        if self.baseline_p95 is None or p95 < self.baseline_p95:
+            self.baseline_p95 = p95
+        else:
+            self.baseline_p95 *= 1.02
+
+    def summary(self):
+        return (f"Concurrency settled at {self.limit} (peak {self.peak}, "
+                f"range {self.minimum}-{self.maximum}, {self.adjustments} adjustments).")
+
+
+class _AsyncSlot:
+    def __init__(self, limiter):
+        self.limiter = limiter
+
+    async def __aenter__(self):
+        start = time.perf_counter()
+        await self.limiter.acquire()
+        record_stage('queue_wait', time.perf_counter() - start)
+        self.start = time.monotonic()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        # A 429 or 5xx leaves the slot as the error raise_for_status() raised
+        self.limiter.release(time.monotonic() - self.start, is_overload_error(exc))
+        return False
+
+
+class AdaptiveLimiter:
+    """asyncio replacement for a fixed Semaphore whose size follows AIMD."""
+
+    def __init__(self, initial, minimum=DEFAULT_MIN_CONCURRENCY, maximum=DEFAULT_MAX_CONCURRENCY):
+        self.controller = AIMDController(initial, minimum, maximum)
+        self.in_flight = 0
+        self._waiters = collections.deque()
+
+    @property
+    def limit(self):
+        return self.controller.limit
+
+    async def acquire(self):
+        while self.in_flight >= self.controller.limit:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # Pass a wake-up we were already given on to the next waiter
+                if waiter.done() and not waiter.cancelled():
+                    self._wake()
+                raise
+        self.in_flight += 1
+
+    def release(self, latency, failed):
+        self.in_flight -= 1
+        self.controller.record(latency, failed)
+        self._wake()
+
+    def _wake(self):
+        free = self.controller.limit - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def slot(self):
+        return _AsyncSlot(self)
+
+    def summary(self):
+        return self.controller.summary()
@@ -0,0 +1,28 @@
+import glob
+import json
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BANNER_FIXTURES = os.path.join(ROOT, 'fixtures', 'banner')
+KUALI_FIXTURES = os.path.join(ROOT, 'fixtures', 'kuali')
+
+def load_banner_pages(fixtures=BANNER_FIXTURES):
+    # Yields (kind, path, args) where args follow the parser signature,
+    # taken from the file name: TERM_SUBJ_NUM, TERM_SUBJ or TERM_CRN.
+    for path in sorted(glob.glob(os.path.join(fixtures, 'listcrse', '*.html'))):
+        yield 'sections', path, tuple(os.path.basename(path)[:-5].split('_'))
+    for path in sorted(glob.glob(os.path.join(fixtures, 'subject', '*.html'))):
+        yield 'sections', path, tuple(os.path.basename(path)[:-5].split('_')) + (None,)
+    for path in sorted(glob.glob(os.path.join(fixtures, 'detail_sched', '*.html'))):
+        yield 'seats', path, tuple(os.path.basename(path)[:-5].split('_'))
+
+def kuali_course_path(pid, fixtures=KUALI_FIXTURES):
+    return os.path.join(fixtures, 'course', f'{pid}.json')
+
+def load_kuali_courses(fixtures=KUALI_FIXTURES):
+    # Yields (catalog list entry, raw course detail bytes) pairs
+    with open(os.path.join(fixtures, 'courses_list.json'), 'r', encoding='utf-8') as f:
+        courses = json.load(f)
+    for course in courses:
+        with open(kuali_course_path(course['pid'], fixtures), 'rb') as f:
+            yield course, f.read()
@@ -0,0 +1,210 @@
+import asyncio
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import aiohttp
+
+from scraper_common.metrics import METRICS, LATENCY_BUCKETS, SIZE_BUCKETS
+from scraper_common.tracing import record_stage
+
+# Seconds a cached response is served without asking the server again,
+# matched by URL substring. Catalog pages barely change, seat counts do.
+DEFAULT_TTLS = {
+    '/api/v1/catalog/': 7 * 24 * 3600,
+    'bwckctlg.p_disp_listcrse': 24 * 3600,
+    'bwckschd.p_get_crse_unsec': 24 * 3600,
+    'bwckschd.p_disp_detail_sched': 5 * 60,
+}
+DEFAULT_TTL = 3600
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+STREAM_CHUNK_SIZE = 8192
+ACCESS_BATCH_SIZE = 200  # cache hits whose last-access times are written in one transaction
+
+# Shared by every scraper in the repo, next to the scraper_common package
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.http-cache')
+
+REQUEST_SECONDS = METRICS.histogram('scraper_request_seconds', "Time from sending a request to its last body byte",
+                                    LATENCY_BUCKETS)
+RESPONSE_BYTES = METRICS.histogram('scraper_response_bytes', "Size of response bodies downloaded", SIZE_BUCKETS)
+RESPONSES = METRICS.counter('scraper_responses_total', "Responses received by status code", ['status'])
+REQUEST_ERRORS = METRICS.counter('scraper_request_errors_total', "Requests that raised, by exception type", ['error'])
+CACHE_LOOKUPS = METRICS.counter('scraper_cache_lookups_total', "Response cache lookups by outcome", ['result'])
+
+
+class CacheEntry:
+    def __init__(self, body, etag, last_modified, fresh):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fresh = fresh
+
+
+class ResponseCache:
+    """Compressed on-disk response cache keyed by URL, with LRU eviction."""
+
+    def __init__(self, path=DEFAULT_CACHE_DIR, ttls=None, max_bytes=DEFAULT_MAX_BYTES):
+        os.makedirs(path, exist_ok=True)
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.stale = 0
+        self.revalidated = 0
+        self.misses = 0
+        # Safe to share between threads as well as tasks on one loop
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(path, 'responses.sqlite3'), check_same_thread=False)
+        # A lost write only costs a refetch, so commits skip the fsync
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            ' url TEXT PRIMARY KEY, body BLOB, size INTEGER, etag TEXT,'
+            ' last_modified TEXT, stored_at REAL, last_access REAL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)')
+        self._db.commit()
+        # Running size of the stored bodies, so eviction does not rescan the table
+        self._total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        # url -> last access time of hits not yet written, flushed in batches
+        self._accessed = {}
+
+    def ttl_for(self, url):
+        for pattern, ttl in self.ttls.items():
+            if pattern in url:
+                return ttl
+        return DEFAULT_TTL
+
+    def get(self, url):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                'SELECT body, etag, last_modified, stored_at FROM responses WHERE url = ?', (url,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._accessed[url] = now
+            if len(self._accessed) >= ACCESS_BATCH_SIZE:
+                self._write_accesses()
+                self._db.commit()
+        body, etag, last_modified, stored_at = row
+        fresh = now - stored_at < self.ttl_for(url)
+        if fresh:
+            self.hits += 1
+        else:
+            self.stale += 1
+        return CacheEntry(zlib.decompress(body), etag, last_modified, fresh)
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def put(self, url, body, headers):
+        compressed = zlib.compress(body)
+        now = time.time()
+        with self._lock:
+            previous = self._db.execute('SELECT size FROM responses WHERE url = ?', (url,)).fetchone()
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (url, compressed, len(compressed), headers.get('ETag'),
+                 headers.get('Last-Modified'), now, now)
+            )
+            self._accessed.pop(url, None)
+            self._total += len(compressed) - (previous[0] if previous else 0)
+            self._evict()
+            self._db.commit()
+
+    def refresh(self, url):
+        # A 304 confirms the stored body, so restart its TTL
+        with self._lock:
+            self._db.execute('UPDATE responses SET stored_at = ? WHERE url = ?', (time.time(), url))
+            self._db.commit()
+        self.revalidated += 1
+
+    def _write_accesses(self):
+        self._db.executemany('UPDATE responses SET last_access = ? WHERE url = ?',
+                             [(accessed, url) for url, accessed in self._accessed.items()])
+        self._accessed.clear()
+
+    def _evict(self):
+        if self._total <= self.max_bytes:
+            return
+        # Pending hits count towards the LRU order
+        self._write_accesses()
+        rows = self._db.execute('SELECT url, size FROM responses ORDER BY last_access').fetchall()
+        for url, size in rows:
+            if self._total <= self.max_bytes:
+                break
+            self._db.execute('DELETE FROM responses WHERE url = ?', (url,))
+            self._total -= size
+
+    def summary(self):
+        return (f"Cache: {self.hits} hits, {self.stale} stale ({self.revalidated} revalidated with 304), "
+                f"{self.misses} misses.")
+
+    def close(self):
+        # Writes the last-access times still pending
+        with self._lock:
+            self._write_accesses()
+            self._db.commit()
+            self._db.close()
+
+
+async def fetch_cached(session, cache, url, headers=None, timeout=10, limiter=None, sink=None):
+    # aiohttp GET through the cache returning the raw body bytes; raises like
+    # response.raise_for_status(). Only the network request takes a limiter
+    # slot, cache hits never wait. A sink (reset() and feed(bytes)) is given
+    # the body chunk by chunk as it downloads, or whole from the cache.
+    headers = dict(headers or {})
+    if sink:
+        sink.reset()
+    entry = cache.get(url) if cache else None
+    if entry and entry.fresh:
+        CACHE_LOOKUPS.inc('fresh')
+        if sink:
+            sink.feed(entry.body)
+        return entry.body
+    if entry:
+        headers.update(cache.conditional_headers(entry))
+    slot = limiter.slot() if limiter else contextlib.AsyncExitStack()
+    async with slot:
+        # Timed from inside the slot, so waiting for one is not latency
+        start = time.perf_counter()
+        try:
+            async with session.get(url, headers=headers, timeout=timeout) as response:
+                RESPONSES.inc(response.status)
+                if entry and response.status == 304:
+                    REQUEST_SECONDS.observe(time.perf_counter() - start)
+                    CACHE_LOOKUPS.inc('revalidated')
+                    cache.refresh(url)
+                    if sink:
+                        sink.feed(entry.body)
+                    return entry.body
+                response.raise_for_status()
+                body_start = time.perf_counter()
+                if sink:
+                    chunks = []
+                    async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                        chunks.append(chunk)
+                        sink.feed(chunk)
+                    body = b''.join(chunks)
+                else:
+                    body = await response.read()
+                record_stage('body', time.perf_counter() - body_start)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            REQUEST_ERRORS.inc(type(e).__name__)
+            raise
+        REQUEST_SECONDS.observe(time.perf_counter() - start)
+        RESPONSE_BYTES.observe(len(body))
+    if cache:
+        CACHE_LOOKUPS.inc('stale' if entry else 'miss')
+        cache.put(url, body, response.headers)
+    return body
@@ -0,0 +1,150 @@
+import csv
+import json
+import logging
+import os
+
+from scraper_common.records import SECTION_FIELDS, COURSE_FIELDS
+from scraper_common.banner import SEAT_FIELDS
+
+logger = logging.getLogger(__name__)
+
+SEAT_VALUE_FIELDS = SEAT_FIELDS[2:]
+# Course ID and Subject Code repeat the section's subject and course_number
+CALENDAR_VALUE_FIELDS = [field for field in COURSE_FIELDS if field not in ('Course ID', 'Subject Code')]
+
+# Column order of the joined dataset: each section, its seat counts and its calendar entry
+JOINED_FIELDS = SECTION_FIELDS + SEAT_VALUE_FIELDS + CALENDAR_VALUE_FIELDS
+
+
+def source_signature(path):
+    # Changes whenever the file is rewritten
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+class SourceIndex:
+    """A small join side read from a CSV into a dict on its key fields.
+
+    refresh() rereads the file only when it has changed since the last
+    read, so a long-running join rebuilds just the index of the source
+    that was updated.
+    """
+
+    def __init__(self, path, key_fields, value_fields):
+        self.path = path
+        self.key_fields = key_fields
+        self.value_fields = value_fields
+        self.signature = None
+        self.rows = {}
+
+    def refresh(self):
+        # Returns whether the index was rebuilt
+        signature = source_signature(self.path)
+        if signature == self.signature:
+            return False
+        rows = {}
+        with open(self.path, 'r', newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                rows[tuple(row[field] for field in self.key_fields)] = tuple(row[field] for field in self.value_fields)
+        self.rows = rows
+        self.signature = signature
+        logger.debug("Indexed %d rows of %s.", len(rows), self.path)
+        return True
+
+
+class JoinReport:
+    """Counts of a join and the keys that found no partner."""
+
+    def __init__(self):
+        self.rows = 0
+        self.without_seats = set()  # (term, crn) of sections with no seat counts
+        self.without_calendar = set()  # course IDs of sections with no calendar entry
+        self.seats_without_section = []  # (term, crn) of seat counts no section has
+        self.calendar_not_offered = 0  # calendar courses with no section
+
+    def summary(self):
+        def sample(keys):
+            keys = sorted(keys)
+            shown = ', '.join(' '.join(key) if isinstance(key, tuple) else key for key in keys[:5])
+            return f" ({shown}{', ...' if len(keys) > 5 else ''})" if keys else ''
+        return (f"Joined {self.rows} sections. "
+                f"{len(self.without_seats)} without seat counts{sample(self.without_seats)}, "
+                f"{len(self.without_calendar)} courses without a calendar entry{sample(self.without_calendar)}, "
+                f"{len(self.seats_without_section)} seat rows without a section"
+                f"{sample(self.seats_without_section)}; "
+                f"{self.calendar_not_offered} calendar courses not offered.")
+
+    def write_unmatched(self, path):
+        # One row per key that found no partner, with the source it is missing from
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['missing_from', 'term', 'crn', 'course_id'])
+            writer.writerows(['seats', term, crn, ''] for term, crn in sorted(self.without_seats))
+            writer.writerows(['calendar', '', '', course_id] for course_id in sorted(self.without_calendar))
+            writer.writerows(['sections', term, crn, ''] for term, crn in sorted(self.seats_without_section))
+
+
+def join_sections(sections_path, seats, calendar, output):
+    # Streams the sections CSV, the large side, through the seat and
+    # calendar indexes into output; sections without a partner keep empty
+    # columns. The output is written beside itself and swapped in, so a
+    # reader never sees a half-written file.
+    report = JoinReport()
+    seen_seats = set()
+    seen_courses = set()
+    no_seats = ('',) * len(SEAT_VALUE_FIELDS)
+    no_calendar = ('',) * len(CALENDAR_VALUE_FIELDS)
+    temp_path = output + '.tmp'
+    with open(sections_path, 'r', newline='', encoding='utf-8') as source, \
+            open(temp_path, 'w', newline='', encoding='utf-8') as target:
+        reader = csv.reader(source)
+        header = next(reader)
+        positions = [header.index(field) for field in SECTION_FIELDS]
+        term_at, crn_at = header.index('term'), header.index('crn')
+        subject_at, number_at = header.index('subject'), header.index('course_number')
+        writer = csv.writer(target)
+        writer.writerow(JOINED_FIELDS)
+        for row in reader:
+            seat_key = (row[term_at], row[crn_at])
+            course_id = row[subject_at] + row[number_at]
+            seat_values = seats.rows.get(seat_key)
+            if seat_values is None:
+                report.without_seats.add(seat_key)
+                seat_values = no_seats
+            else:
+                seen_seats.add(seat_key)
+            calendar_values = calendar.rows.get((course_id,))
+            if calendar_values is None:
+                report.without_calendar.add(course_id)
+                calendar_values = no_calendar
+            else:
+                seen_courses.add(course_id)
+            writer.writerow([row[i] for i in positions] + list(seat_values) + list(calendar_values))
+            report.rows += 1
+    os.replace(temp_path, output)
+    report.seats_without_section = [key for key in seats.rows if key not in seen_seats]
+    report.calendar_not_offered = len(calendar.rows) - len(seen_courses)
+    return report
+
+
+class JoinState:
+    """Signatures of the sources an output was last joined from.
+
+    Kept in a JSON file beside the output, so a rerun can tell whether any
+    source has changed since.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.sources = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.sources = json.load(f)
+
+    def is_current(self, paths):
+        return all(self.sources.get(path) == source_signature(path) for path in paths)
+
+    def save(self, signatures):
+        self.sources = signatures
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(signatures, f, indent=1)
@@ -0,0 +1,62 @@
+import json
+import os
+
+FSYNC_EVERY = 50  # entries between fsyncs; every entry is flushed to the OS
+
+
+class Journal:
+    """Append-only JSON-lines log of finished work keys and their parsed rows.
+
+    Each line is {"key": [...], "rows": [...]}. Opening with resume=True keeps
+    the existing entries (dropping a line cut short by a crash) so a rerun can
+    skip them; otherwise the journal starts empty.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.done = set()
+        self._entries = 0
+        if resume and os.path.exists(path):
+            good_size = 0
+            for key, _, end in self._read():
+                self.done.add(key)
+                good_size = end
+            with open(path, 'r+b') as f:
+                f.truncate(good_size)
+            self._file = open(path, 'a', encoding='utf-8')
+        else:
+            self._file = open(path, 'w', encoding='utf-8')
+
+    def _read(self):
+        with open(self.path, 'rb') as f:
+            offset = 0
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # partially written by an interrupted run
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                offset += len(line)
+                yield tuple(entry['key']), entry['rows'], offset
+
+    def replay(self):
+        # Rows of every entry kept from the previous run, in journal order
+        if not self.done:
+            return
+        self._file.flush()
+        for _, rows, _ in self._read():
+            yield from rows
+
+    def record(self, key, rows):
+        self._file.write(json.dumps({'key': list(key), 'rows': rows}, ensure_ascii=False) + '\n')
+        self._file.flush()
+        self.done.add(tuple(key))
+        self._entries += 1
+        if self._entries % FSYNC_EVERY == 0:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
@@ -0,0 +1,68 @@
+import json
+import re
+
+READ_CHUNK_SIZE = 64 * 1024  # characters read from the file at a time
+NUMBER_END = re.compile(r'[\s,\]]')
+
+
+def iter_json_array(f, chunk_size=READ_CHUNK_SIZE):
+    """Yields the elements of a top-level JSON array from a text file object.
+
+    Elements are decoded one at a time with JSONDecoder.raw_decode as the
+    file is read, so only the current element and one chunk are in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    at_eof = False
+
+    def read_more():
+        nonlocal buffer, position, at_eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            at_eof = True
+        buffer = buffer[position:] + chunk
+        position = 0
+
+    def next_token():
+        # Skips whitespace and returns the next character ('' at end of file)
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n':
+                position += 1
+            if position < len(buffer) or at_eof:
+                return buffer[position:position + 1]
+            read_more()
+
+    def fail(message):
+        raise json.JSONDecodeError(message, buffer, position)
+
+    if next_token() != '[':
+        fail("Expected a JSON array")
+    position += 1
+    if next_token() == ']':
+        return
+    while True:
+        if not next_token():
+            fail("Unterminated JSON array")
+        try:
+            element, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if at_eof:
+                raise
+            read_more()
+            continue
+        if isinstance(element, (int, float)) and not at_eof and not NUMBER_END.search(buffer, end):
+            # The number may continue in the next chunk, decode it again
+            read_more()
+            continue
+        position = end
+        yield element
+        separator = next_token()
+        if not separator:
+            fail("Unterminated JSON array")
+        if separator not in ',]':
+            fail("Expected ',' or ']'")
+        position += 1
+        if separator == ']':
+            return
@@ -0,0 +1,52 @@
+import logging
+import logging.handlers
+import sys
+import threading
+
+BUFFER_CAPACITY = 500  # records held before they are written out
+FLUSH_INTERVAL = 1.0  # seconds a debug record may wait in the buffer
+
+
+class BufferedHandler(logging.handlers.MemoryHandler):
+    """Writes debug records out in batches instead of flushing on every line.
+
+    Progress, status lines and anything more severe go out at once. Debug
+    records, a line per request with -v, are buffered until the buffer is
+    full, a more severe record arrives, a background thread's flush every
+    flush_interval seconds, or exit.
+    """
+
+    def __init__(self, target, capacity=BUFFER_CAPACITY, flush_interval=FLUSH_INTERVAL):
+        super().__init__(capacity, flushLevel=logging.INFO, target=target)
+        self.flush_interval = flush_interval
+        self._closed = threading.Event()
+        threading.Thread(target=self._flush_periodically, name='log-flush', daemon=True).start()
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            if self.buffer:
+                self.flush()
+
+    def close(self):
+        self._closed.set()
+        super().close()
+
+
+# Loggers of the scrapers themselves; -v turns on their debug output
+SCRAPER_LOGGERS = ('__main__', 'scraper_common')
+
+
+def setup_logging(verbosity=0, loggers=()):
+    # -1 (--quiet) shows warnings and errors, 0 the progress and summaries
+    # printed before, 1 (-v) adds a line for every request and task, and 2
+    # (-vv) debug output from asyncio and aiohttp as well. Disabled levels
+    # are filtered before a message is formatted. loggers names the loggers
+    # of scripts loaded as modules, which get the scripts' level too.
+    level = {-1: logging.WARNING, 0: logging.INFO}.get(verbosity, logging.DEBUG)
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(logging.Formatter('%(message)s'))
+    root = logging.getLogger()
+    root.handlers[:] = [BufferedHandler(stream)]
+    root.setLevel(level if verbosity >= 2 else max(level, logging.INFO))
+    for name in SCRAPER_LOGGERS + tuple(loggers):
+        logging.getLogger(name).setLevel(level)
@@ -0,0 +1,176 @@
+import bisect
+import json
+import math
+
+# Seconds; spans a cached local response up to a slow BAN1P listing
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+DEPTH_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    """Monotonic count per combination of label values."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        # An unlabelled metric reports 0 before it is first updated
+        self.values = {} if self.labelnames else {(): 0}
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in sorted(self.values.items()):
+            yield self.name, labels, (), value
+
+    def as_json(self):
+        return [{'labels': dict(zip(self.labelnames, labels)), 'value': value}
+                for labels, value in sorted(self.values.items())]
+
+
+class Gauge(Counter):
+    """Current value per combination of label values."""
+
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        self.values[labels] = value
+
+
+class Histogram:
+    """Observations counted into fixed cumulative buckets, Prometheus style."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets, labelnames=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = tuple(labelnames)
+        self.values = {}  # labels -> [per-bucket counts (+Inf last), sum, count]
+
+    def observe(self, value, *labels):
+        state = self.values.get(labels)
+        if state is None:
+            state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def cumulative(self, labels):
+        counts, total, count = self.values[labels]
+        running = 0
+        for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+            running += bucket_count
+            yield bound, running
+
+    def samples(self):
+        for labels in sorted(self.values):
+            for bound, running in self.cumulative(labels):
+                yield self.name + '_bucket', labels, (('le', _format_value(float(bound))),), running
+            _, total, count = self.values[labels]
+            yield self.name + '_sum', labels, (), total
+            yield self.name + '_count', labels, (), count
+
+    def as_json(self):
+        return [{
+            'labels': dict(zip(self.labelnames, labels)),
+            'buckets': {_format_value(float(bound)): running for bound, running in self.cumulative(labels)},
+            'sum': self.values[labels][1],
+            'count': self.values[labels][2],
+        } for labels in sorted(self.values)]
+
+
+class Metrics:
+    """A registry of counters, gauges and histograms for one process.
+
+    Updating a metric is a dict lookup and an addition, cheap enough for
+    every request. The registry is exported at the end of a run with
+    write(), or served live by serve_metrics().
+    """
+
+    def __init__(self):
+        self.metrics = {}
+
+    def _get(self, cls, name, *args, **kwargs):
+        if name not in self.metrics:
+            self.metrics[name] = cls(name, *args, **kwargs)
+        return self.metrics[name]
+
+    def counter(self, name, help, labelnames=()):
+        return self._get(Counter, name, help, labelnames)
+
+    def gauge(self, name, help, labelnames=()):
+        return self._get(Gauge, name, help, labelnames)
+
+    def histogram(self, name, help, buckets, labelnames=()):
+        return self._get(Histogram, name, help, buckets, labelnames)
+
+    def prometheus_text(self):
+        # Prometheus text exposition format, version 0.0.4
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, extra, value in metric.samples():
+                lines.append(f"{name}{_format_labels(metric.labelnames, labels, extra)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def as_json(self):
+        return {metric.name: {'type': metric.kind, 'help': metric.help, 'values': metric.as_json()}
+                for metric in self.metrics.values()}
+
+    def write(self, path):
+        # JSON for a .json path, Prometheus text otherwise
+        with open(path, 'w', encoding='utf-8') as f:
+            if path.endswith('.json'):
+                json.dump(self.as_json(), f, indent=1)
+                f.write('\n')
+            else:
+                f.write(self.prometheus_text())
+
+
+# The registry every scraper module records into
+METRICS = Metrics()
+
+
+async def serve_metrics(metrics, port, host='127.0.0.1'):
+    # Serves /metrics (Prometheus text) and /metrics.json from the running
+    # loop. Returns the aiohttp runner; await runner.cleanup() to stop.
+    # aiohttp.web is imported here, it adds a fifth to a short run's startup
+    from aiohttp import web
+
+    async def prometheus(request):
+        return web.Response(body=metrics.prometheus_text().encode('utf-8'),
+                            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    async def as_json(request):
+        return web.json_response(metrics.as_json())
+
+    app = web.Application()
+    app.router.add_get('/metrics', prometheus)
+    app.router.add_get('/metrics.json', as_json)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from scraper_common.metrics import METRICS, LATENCY_BUCKETS
+from scraper_common.tracing import record_stage
+from scraper_common.profiling import SamplingProfiler, start_worker_profiler, read_profiles, write_profile
+
+DEFAULT_PARSE_WORKERS = os.cpu_count() or 1
+
+logger = logging.getLogger(__name__)
+
+PARSE_SECONDS = METRICS.histogram('scraper_parse_seconds', "CPU-bound time spent parsing one page",
+                                  LATENCY_BUCKETS, ['backend'])
+
+
+def record_parse(seconds, backend):
+    PARSE_SECONDS.observe(seconds, backend)
+    record_stage('parse', seconds)
+
+
+def timed(func, *args):
+    # Runs in the worker, so the time excludes the pool's queue and pickling
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+class ParseStage:
+    """Runs CPU-bound page parsers in a process pool off the event loop.
+
+    At most max_pending pages are queued for the pool at once; callers wait
+    in run() beyond that, which holds back their next fetch. With workers=0
+    parsing happens inline on the loop, as it used to. backend names the
+    parser implementation callers should hand to the row functions.
+
+    With profile_path set, every worker runs a sampling profiler (the
+    scraper itself does with workers=0) and close() writes the merged
+    samples there.
+    """
+
+    def __init__(self, workers=DEFAULT_PARSE_WORKERS, max_pending=None, backend='bs4', profile_path=None):
+        self.workers = workers
+        self.backend = backend
+        self.profile_path = profile_path
+        self._profile_dir = None
+        self._profiler = None
+        initializer, initargs = None, ()
+        if profile_path and not SamplingProfiler.available:
+            logger.warning("Profiling needs signal.setitimer, which this platform does not have; --profile ignored.")
+            self.profile_path = None
+        elif profile_path:
+            self._profile_dir = tempfile.mkdtemp(prefix='parse-profile-')
+            if workers:
+                initializer, initargs = start_worker_profiler, (self._profile_dir,)
+            else:
+                self._profiler = SamplingProfiler().start()
+        self._executor = ProcessPoolExecutor(max_workers=workers, initializer=initializer,
+                                             initargs=initargs) if workers else None
+        self._pending = asyncio.Semaphore(max_pending or max(workers, 1) * 2)
+
+    async def run(self, func, *args):
+        if self._executor is None:
+            seconds, result = timed(func, *args)
+        else:
+            async with self._pending:
+                seconds, result = await asyncio.get_running_loop().run_in_executor(self._executor, timed, func, *args)
+        record_parse(seconds, self.backend)
+        return result
+
+    def close(self):
+        if self._executor is not None:
+            # Workers write their samples as they exit
+            self._executor.shutdown()
+        if self._profile_dir is None:
+            return
+        if self._profiler is not None:
+            self._profiler.dump(os.path.join(self._profile_dir, f'{os.getpid()}.json'))
+        write_profile(self.profile_path, read_profiles(self._profile_dir), f"{self.backend} parse")
+        shutil.rmtree(self._profile_dir, ignore_errors=True)
+        self._profile_dir = None
+        logger.info("Parse profile written to %s", self.profile_path)
@@ -0,0 +1,169 @@
+import asyncio
+import csv
+import time
+
+from scraper_common.metrics import METRICS, DEPTH_BUCKETS
+from scraper_common.tracing import timed_stage
+
+WRITE_BATCH_SIZE = 200  # rows buffered before they are flushed to disk
+
+QUEUE_DEPTH = METRICS.histogram('scraper_queue_depth', "Items waiting in a pipeline queue when one is taken",
+                                DEPTH_BUCKETS, ['queue'])
+
+
+class CsvStreamWriter:
+    """Appends rows to a CSV file as they arrive, flushing in batches.
+
+    Rows are either dicts keyed by field name or sequences (SectionRow,
+    tuples, lists) already in fieldnames order.
+    """
+
+    def __init__(self, filename, fieldnames, batch_size=WRITE_BATCH_SIZE):
+        self.filename = filename
+        self.fieldnames = fieldnames
+        self.batch_size = batch_size
+        self.rows_written = 0
+        self._pending = 0
+        self._file = open(filename, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(fieldnames)
+
+    def write(self, rows):
+        rows = [[row.get(field, '') for field in self.fieldnames] if isinstance(row, dict) else row
+                for row in rows]
+        self._writer.writerows(rows)
+        self.rows_written += len(rows)
+        self._pending += len(rows)
+        if self._pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        self._file.flush()
+        self._pending = 0
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+async def run_pipeline(jobs, handle, write, workers, queue_size=None):
+    """Feed jobs through a fixed pool of workers into a single writer.
+
+    jobs is any iterable and is consumed lazily, handle(job) is a coroutine,
+    and write(result) is called with each result from one task in
+    completion order. Both queues are bounded, so memory use does not grow
+    with the number of jobs. Returns the number of jobs processed.
+    """
+    queue_size = queue_size or workers * 2
+    job_queue = asyncio.Queue(maxsize=queue_size)
+    result_queue = asyncio.Queue(maxsize=queue_size)
+    processed = 0
+
+    async def producer():
+        for job in jobs:
+            await job_queue.put(job)
+        for _ in range(workers):
+            await job_queue.put(None)
+
+    async def worker():
+        try:
+            while (job := await job_queue.get()) is not None:
+                QUEUE_DEPTH.observe(job_queue.qsize(), 'jobs')
+                result = await handle(job)
+                await result_queue.put((result,))
+        finally:
+            await result_queue.put(None)
+
+    async def writer():
+        nonlocal processed
+        finished = 0
+        while finished < workers:
+            item = await result_queue.get()
+            QUEUE_DEPTH.observe(result_queue.qsize(), 'results')
+            if item is None:
+                finished += 1
+                continue
+            processed += 1
+            with timed_stage('write'):
+                write(item[0])
+
+    tasks = [asyncio.create_task(producer()), asyncio.create_task(writer())]
+    tasks += [asyncio.create_task(worker()) for _ in range(workers)]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+    return processed
+
+
+class Stage:
+    """One step of a streaming pipeline: a bounded queue and its own workers.
+
+    Items put on a stage are handled by at most `workers` handle(item)
+    coroutines at once, so a downstream stage starts on the first item an
+    upstream one emits instead of waiting for it to finish. A stage is
+    filled either from an iterable given to start(), or by put() and
+    put_nowait() followed by close(). wait() returns once every item has
+    been handled; if a worker raises, the rest of the stage is cancelled,
+    so nothing is left blocked on a full queue, and wait() raises it.
+    """
+
+    def __init__(self, name, handle, workers, queue_size=None):
+        self.name = name
+        self.handle = handle
+        self.workers = workers
+        self.queue = asyncio.Queue(maxsize=queue_size or workers * 2)
+        self.processed = 0
+        # Monotonic times the first and last item finished, to show how stages overlap
+        self.first_done = self.last_done = None
+        self._tasks = []
+
+    def start(self, items=None):
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        if items is not None:
+            self._tasks.append(asyncio.create_task(self._feed(items)))
+
+    async def _feed(self, items):
+        for item in items:
+            await self.queue.put(item)
+        await self.close()
+
+    async def put(self, item):
+        await self.queue.put(item)
+
+    def put_nowait(self, item):
+        # Raises asyncio.QueueFull when the queue is full
+        self.queue.put_nowait(item)
+
+    async def close(self):
+        # Called once nothing more will be put
+        for _ in range(self.workers):
+            await self.queue.put(None)
+
+    async def _work(self):
+        while (item := await self.queue.get()) is not None:
+            QUEUE_DEPTH.observe(self.queue.qsize(), self.name)
+            await self.handle(item)
+            self.processed += 1
+            self.last_done = time.monotonic()
+            if self.first_done is None:
+                self.first_done = self.last_done
+
+    async def wait(self):
+        done, _ = await asyncio.wait(self._tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            if not task.cancelled() and task.exception() is not None:
+                self.cancel()
+                raise task.exception()
+
+    def cancel(self):
+        for task in self._tasks:
+            task.cancel()
+
+    def summary(self, start):
+        # start is the monotonic time the pipeline started
+        if self.first_done is None:
+            return f"{self.name}: nothing processed."
+        return (f"{self.name}: {self.processed} done by {self.workers} workers, "
+                f"first at {self.first_done - start:.1f}s, last at {self.last_done - start:.1f}s.")
@@ -0,0 +1,144 @@
+import asyncio
+import heapq
+import random
+import time
+
+from scraper_common.metrics import METRICS
+from scraper_common.tracing import record_stage
+
+# Refresh intervals in seconds; a section is polled at least this often and at most
+MIN_INTERVAL = 60
+MAX_INTERVAL = 3600
+DEFAULT_BUDGET = 300  # requests per minute, retries included
+CHANGE_ALPHA = 0.25  # weight of the latest poll in a CRN's change rate
+CHANGE_PRIOR = 0.25  # change rate assumed before a CRN has been polled twice
+CHANGE_WEIGHT = 0.9  # how far a CRN that changes on every poll shortens its interval
+FULL_SHARE = 0.25  # interval of a full section that is not changing, as a share of the longest
+
+POLLS = METRICS.counter('scraper_seat_polls_total', "Seat capacity polls by outcome", ['result'])
+OVERDUE = METRICS.gauge('scraper_seat_polls_overdue', "CRNs past their refresh time")
+
+
+def poll_interval(counts, change_rate, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL):
+    # Seconds until a CRN is polled again, from its seat counts (in SEAT_FIELDS
+    # order after term and crn) and how often recent polls found a change.
+    # Open seats as a share of capacity set a base interval, from a quarter
+    # of max_interval for a full section or one with a waitlist to all of it
+    # for an empty one. Sections without a capacity rarely change. A CRN
+    # that keeps changing has its interval cut by up to 90%. Blank counts
+    # (None) are taken as 0.
+    capacity, _, remaining, _, waitlist_actual, _ = (count or 0 for count in counts)
+    if waitlist_actual > 0:
+        openness = 0.0
+    elif capacity > 0:
+        openness = min(max(remaining / capacity, 0.0), 1.0)
+    else:
+        openness = 1.0
+    interval = max_interval * (FULL_SHARE + (1 - FULL_SHARE) * openness)
+    interval *= 1 - CHANGE_WEIGHT * change_rate
+    return min(max(interval, min_interval), max_interval)
+
+
+class RequestBudget:
+    """Spaces requests evenly so at most per_minute start in any minute."""
+
+    def __init__(self, per_minute=DEFAULT_BUDGET):
+        self.per_minute = per_minute
+        self.spacing = 60 / per_minute
+        self._next = 0.0
+
+    async def acquire(self):
+        now = time.monotonic()
+        start = max(now, self._next)
+        self._next = start + self.spacing
+        if start > now:
+            await asyncio.sleep(start - now)
+            record_stage('queue_wait', start - now)
+
+
+class PollScheduler:
+    """Decides which CRN to poll next, keeping busy sections the freshest.
+
+    Every CRN has a refresh interval from poll_interval() and sits in a
+    heap ordered by when it is next due. CRNs are taken from the heap as
+    they fall due; when more are due than the request budget allows, the
+    longest overdue go first. A CRN with no known counts is due at once.
+    """
+
+    def __init__(self, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.counts = {}  # (term, crn) -> last polled counts
+        self.change_rates = {}
+        self.intervals = {}
+        self._heap = []  # (due, key), monotonic seconds
+        self._wakeup = asyncio.Event()
+
+    def add(self, key, counts=None):
+        # Known counts, e.g. from the seat history, spread the first polls
+        # over each CRN's interval instead of polling everything at once
+        now = time.monotonic()
+        self.change_rates[key] = CHANGE_PRIOR
+        if counts is None:
+            due = now
+        else:
+            self.counts[key] = counts
+            self.intervals[key] = poll_interval(counts, CHANGE_PRIOR, self.min_interval, self.max_interval)
+            due = now + random.uniform(0, self.intervals[key])
+        heapq.heappush(self._heap, (due, key))
+        self._wakeup.set()
+
+    def record(self, key, counts):
+        # Reschedules a polled CRN; counts is None when the poll failed.
+        # Returns whether its counts changed.
+        now = time.monotonic()
+        if counts is None:
+            POLLS.inc('failed')
+            changed = False
+        else:
+            previous = self.counts.get(key)
+            changed = previous is not None and counts != previous
+            if previous is not None:
+                rate = self.change_rates[key]
+                self.change_rates[key] = rate + CHANGE_ALPHA * ((1.0 if changed else 0.0) - rate)
+            self.counts[key] = counts
+            self.intervals[key] = poll_interval(counts, self.change_rates[key], self.min_interval, self.max_interval)
+            POLLS.inc('changed' if changed else 'unchanged')
+        heapq.heappush(self._heap, (now + self.intervals.get(key, self.min_interval), key))
+        self._wakeup.set()
+        return changed
+
+    def remove(self, key):
+        # Stops polling a CRN; call it instead of record() for a taken key
+        for table in (self.counts, self.change_rates, self.intervals):
+            table.pop(key, None)
+
+    async def next_due(self):
+        # Waits until the CRN at the top of the heap is due and takes it
+        while True:
+            now = time.monotonic()
+            if self._heap and self._heap[0][0] <= now:
+                return heapq.heappop(self._heap)[1]
+            self._wakeup.clear()
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def overdue(self):
+        now = time.monotonic()
+        count = sum(1 for due, _ in self._heap if due <= now)
+        OVERDUE.set(count)
+        return count
+
+    def demand(self):
+        # Polls per minute the current intervals ask for
+        return sum(60 / interval for interval in self.intervals.values())
+
+    def summary(self):
+        if not self.intervals:
+            return "Polling: no CRN has been polled yet."
+        intervals = sorted(self.intervals.values())
+        return (f"Polling {len(self.change_rates)} CRNs: intervals {intervals[0]:.0f}-{intervals[-1]:.0f}s "
+                f"(median {intervals[len(intervals) // 2]:.0f}s), {self.demand():.0f} polls/min wanted.")
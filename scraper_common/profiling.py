@@ -0,0 +1,116 @@
+import collections
+import json
+import os
+import signal
+import sys
+from multiprocessing import util
+
+SAMPLE_INTERVAL = 0.005  # seconds of CPU time between samples
+
+
+class SamplingProfiler:
+    """Samples the Python stack every interval of CPU time with SIGPROF.
+
+    Stacks are counted, outermost frame first, in self.samples, and stop
+    short of the frame stop_at if one is given. Only the main thread is
+    sampled, which in a parse worker is the one parsing. Needs setitimer,
+    so it is not available on Windows.
+    """
+
+    available = hasattr(signal, 'setitimer')
+
+    def __init__(self, interval=SAMPLE_INTERVAL, stop_at=None):
+        self.interval = interval
+        self.stop_at = stop_at
+        self.samples = collections.Counter()
+
+    def _sample(self, signum, frame):
+        stack = []
+        while frame is not None and frame is not self.stop_at:
+            code = frame.f_code
+            stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+            frame = frame.f_back
+        self.samples[tuple(reversed(stack))] += 1
+
+    def start(self):
+        signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        return self
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, signal.SIG_DFL)
+
+    def dump(self, path):
+        self.stop()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'interval': self.interval,
+                       'samples': [[list(map(list, stack)), count] for stack, count in self.samples.items()]}, f)
+
+
+def start_worker_profiler(directory, interval=SAMPLE_INTERVAL):
+    # Process pool initializer: profiles the worker until it exits, then
+    # leaves its samples in directory for read_profiles(). A forked worker
+    # still has the parent's frames below its own loop, those are left out.
+    profiler = SamplingProfiler(interval, stop_at=sys._getframe(1).f_back).start()
+    util.Finalize(profiler, profiler.dump, args=(os.path.join(directory, f'{os.getpid()}.json'),),
+                  exitpriority=10)
+
+
+def read_profiles(directory):
+    # (name, interval, samples) for every profile dumped in directory
+    profiles = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.json'):
+            with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            samples = collections.Counter({tuple(map(tuple, stack)): count for stack, count in data['samples']})
+            profiles.append((f"pid {name[:-len('.json')]}", data['interval'], samples))
+    return profiles
+
+
+def write_profile(path, profiles, name='scrape'):
+    # Folded stacks for flamegraph.pl when path ends in .folded or .txt,
+    # otherwise a speedscope (https://www.speedscope.app) sampled profile
+    if path.endswith(('.folded', '.txt')):
+        merged = collections.Counter()
+        for _, _, samples in profiles:
+            for stack, count in samples.items():
+                merged[';'.join(frame[0] for frame in stack)] += count
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in merged.most_common():
+                f.write(f"{stack} {count}\n")
+        return
+
+    frames = []
+    frame_index = {}
+    speedscope_profiles = []
+    for profile_name, interval, samples in profiles:
+        stacks = []
+        weights = []
+        for stack, count in samples.items():
+            indices = []
+            for frame in stack:
+                if frame not in frame_index:
+                    frame_index[frame] = len(frames)
+                    frames.append({'name': frame[0], 'file': frame[1], 'line': frame[2]})
+                indices.append(frame_index[frame])
+            stacks.append(indices)
+            weights.append(count * interval)
+        speedscope_profiles.append({
+            'type': 'sampled',
+            'name': profile_name,
+            'unit': 'seconds',
+            'startValue': 0,
+            'endValue': sum(weights),
+            'samples': stacks,
+            'weights': weights,
+        })
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name,
+            'exporter': 'scraper_common.profiling',
+            'shared': {'frames': frames},
+            'profiles': speedscope_profiles,
+        }, f)
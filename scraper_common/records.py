@@ -0,0 +1,73 @@
+# Column order of scraped_course_data.csv
+SECTION_FIELDS = [
+    'term', 'subject', 'course_name', 'course_number', 'crn', 'section',
+    'frequency', 'time', 'days', 'location', 'date_range', 'schedule_type',
+    'instructor', 'instructional_method', 'units', 'additional_information'
+]
+
+# Columns with few distinct values across a run; every section repeats them.
+# crn and additional_information are nearly unique and stay as they are.
+INTERNED_FIELDS = frozenset([
+    'term', 'subject', 'course_name', 'course_number', 'section', 'frequency',
+    'time', 'days', 'location', 'date_range', 'schedule_type', 'instructor',
+    'instructional_method', 'units'
+])
+
+# Column order of the calendar scraper's course details CSV
+COURSE_FIELDS = [
+    'PID', 'Course ID', 'Subject Code', 'Title', 'Description', 'Credits',
+    'Prerequisites', 'Corequisites', 'Recommendations', 'Notes'
+]
+
+# One shared copy of each repeated value for the life of the process
+_intern_table = {}
+
+def intern_value(value):
+    return _intern_table.setdefault(value, value)
+
+
+class SectionRow:
+    """One row of scraped_course_data.csv.
+
+    Slotted rather than a dict, iterates in SECTION_FIELDS order (so it can
+    be written or pickled as a plain sequence) and supports row['field']
+    access for the parsers. Values of INTERNED_FIELDS are shared through the
+    intern table, including values rebuilt from a worker's tuples.
+    """
+
+    __slots__ = tuple(SECTION_FIELDS)
+
+    def __init__(self, *values):
+        for field, value in zip(SECTION_FIELDS, values):
+            self[field] = value
+        for field in SECTION_FIELDS[len(values):]:
+            setattr(self, field, '')
+
+    def __getitem__(self, field):
+        return getattr(self, field)
+
+    def __setitem__(self, field, value):
+        if field in INTERNED_FIELDS and value is not None:
+            value = intern_value(value)
+        setattr(self, field, value)
+
+    def __iter__(self):
+        for field in SECTION_FIELDS:
+            yield getattr(self, field)
+
+    def __len__(self):
+        return len(SECTION_FIELDS)
+
+    def __eq__(self, other):
+        if isinstance(other, SectionRow):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __reduce__(self):
+        return (SectionRow, tuple(self))
+
+    def as_dict(self):
+        return dict(zip(SECTION_FIELDS, self))
+
+    def __repr__(self):
+        return f"SectionRow({self.as_dict()})"
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from scraper_common.metrics import METRICS
+from scraper_common.tracing import timed_stage
+
+MAX_ATTEMPTS = 3
+BASE_DELAY = 1.0  # seconds before the first retry, doubled per attempt
+MAX_DELAY = 30.0
+MAX_RETRY_AFTER = 300.0  # ignore Retry-After values longer than this
+BREAKER_THRESHOLD = 5  # consecutive failures that open a host's circuit
+BREAKER_COOLDOWN = 30.0
+
+logger = logging.getLogger(__name__)
+
+RETRIES = METRICS.counter('scraper_retries_total', "Failed attempts scheduled to be tried again")
+FAILED_REQUESTS = METRICS.counter('scraper_failed_requests_total', "Requests given up on after their last attempt")
+BREAKER_OPENS = METRICS.counter('scraper_circuit_opens_total', "Times a host's circuit breaker opened", ['host'])
+
+
+def retry_after_seconds(headers):
+    # Retry-After is either a number of seconds or an HTTP date
+    value = headers.get('Retry-After') if headers else None
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+def backoff_delay(attempt, base=BASE_DELAY, cap=MAX_DELAY):
+    # Exponential backoff with jitter so failed requests do not retry in lockstep
+    delay = min(cap, base * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def is_retryable(exc):
+    status = getattr(exc, 'status', None)
+    if isinstance(exc, aiohttp.ClientResponseError) and status is not None:
+        return status >= 500 or status in (408, 429)
+    return isinstance(exc, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+class CircuitBreaker:
+    """Stops requests to a host after repeated failures, then lets one probe through."""
+
+    def __init__(self, host, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.host = host
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.times_opened = 0
+
+    def wait_time(self):
+        # Seconds to wait before sending a request to this host
+        if self.failures < self.threshold:
+            return 0.0
+        remaining = self.open_until - time.monotonic()
+        if remaining > 0:
+            return remaining
+        if self.probing:
+            return min(self.cooldown, 1.0)
+        self.probing = True  # half-open: this caller is the probe
+        return 0.0
+
+    def record_success(self):
+        self.failures = 0
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.failures >= self.threshold:
+            now = time.monotonic()
+            if self.open_until <= now:
+                self.times_opened += 1
+                BREAKER_OPENS.inc(self.host)
+                logger.warning("Circuit opened for %s after %d consecutive failures; pausing %.0f seconds.",
+                               self.host, self.failures, self.cooldown)
+            self.open_until = now + self.cooldown
+
+
+class RetryScheduler:
+    """Runs request attempts with jittered backoff outside any concurrency slot.
+
+    A failed attempt releases its limiter slot before it is deferred, so
+    requests that are backing off never block healthy ones.
+    """
+
+    def __init__(self, max_attempts=MAX_ATTEMPTS, base_delay=BASE_DELAY, max_delay=MAX_DELAY):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breakers = {}
+        self.deferred = 0  # requests currently waiting for their next attempt
+        self.retries = 0
+        self.failures = 0
+
+    def breaker(self, url):
+        host = urlsplit(url).netloc
+        if host not in self.breakers:
+            self.breakers[host] = CircuitBreaker(host)
+        return self.breakers[host]
+
+    async def defer(self, delay):
+        self.deferred += 1
+        try:
+            with timed_stage('retry_wait'):
+                await asyncio.sleep(delay)
+        finally:
+            self.deferred -= 1
+
+    async def run(self, url, attempt, label):
+        # attempt() performs one request (taking and releasing its own slot)
+        breaker = self.breaker(url)
+        for attempt_number in range(self.max_attempts):
+            wait = breaker.wait_time()
+            while wait > 0:
+                await self.defer(wait)
+                wait = breaker.wait_time()
+            # Set by wait_time() when this attempt is the half-open probe
+            probe = breaker.probing
+            try:
+                result = await attempt()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if not is_retryable(e):
+                    breaker.record_success()  # the host answered, it is up
+                    logger.warning("Giving up on %s: %s.", label, e)
+                    break
+                breaker.record_failure()
+                if attempt_number + 1 == self.max_attempts:
+                    break
+                delay = retry_after_seconds(getattr(e, 'headers', None))
+                if delay is None:
+                    delay = backoff_delay(attempt_number, self.base_delay, self.max_delay)
+                self.retries += 1
+                RETRIES.inc()
+                logger.warning("Attempt %d failed for %s: %s. Retrying in %.1f seconds...",
+                               attempt_number + 1, label, e, delay)
+                await self.defer(delay)
+            else:
+                breaker.record_success()
+                return result
+            finally:
+                # A probe that was cancelled or raised something unexpected
+                # must not leave every other request waiting for it
+                if probe:
+                    breaker.probing = False
+        self.failures += 1
+        FAILED_REQUESTS.inc()
+        logger.error("Failed to fetch %s after %d attempts.", label, attempt_number + 1)
+        return None
+
+    def summary(self):
+        opened = sum(breaker.times_opened for breaker in self.breakers.values())
+        return f"Retries: {self.retries} scheduled, {self.failures} requests failed, circuit opened {opened} times."
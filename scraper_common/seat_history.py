@@ -0,0 +1,308 @@
+import logging
+import os
+import time
+from bisect import bisect_right
+
+from scraper_common.banner import SEAT_FIELDS
+
+logger = logging.getLogger(__name__)
+
+KEYFRAME_INTERVAL = 48  # deltas between full snapshots; bounds what a lookup replays
+COUNT_FIELDS = SEAT_FIELDS[2:]
+KEYFRAME, DELTA = b'K', b'D'
+PRESENT = 0x40  # entry mask bit of a row that exists; a mask of 0 removes the row
+BLANKS = 0x80  # entry mask bit of a row with a blank byte after the mask
+HEADER_READ = 16  # bytes that always hold a record's length, kind and timestamp
+
+# A history file is a sequence of records, one per poll:
+#
+#   varint length, then kind (K or D), varint timestamp,
+#   varint new key count, then each new key's term and crn front coded
+#     against the previous new key: varint length of the shared prefix,
+#     then the rest as varint length and UTF-8 bytes,
+#   varint entry count, then per entry in key id order: varint gap from
+#     the previous entry's key id, a mask byte (PRESENT plus one bit per
+#     count that changed, plus BLANKS if any changed count is now blank),
+#     then if BLANKS a byte with one bit per changed count that is blank,
+#     and a zigzag varint delta for each other changed count.
+#
+# Blank counts, of a page without a Seats or Waitlist row, are None in
+# memory and '' in the CSV. A delta from a blank count starts from 0.
+#
+# A keyframe (K) starts from no rows and renumbers the keys, so it can be
+# decoded on its own. A delta (D) holds only the rows that changed since
+# the previous record and appends key ids for CRNs it has not seen.
+
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def zigzag(value):
+    # Small negative and positive deltas both become small varints
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+
+def unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def write_string(out, value):
+    data = value.encode('utf-8')
+    write_varint(out, len(data))
+    out += data
+
+
+def read_string(data, pos):
+    length, pos = read_varint(data, pos)
+    return data[pos:pos + length].decode('utf-8'), pos + length
+
+
+def write_keys(out, keys):
+    # Sorted keys share most of their term and crn with the one before
+    previous = ('', '')
+    write_varint(out, len(keys))
+    for key in keys:
+        for value, before in zip(key, previous):
+            shared = len(os.path.commonprefix([value, before]))
+            write_varint(out, shared)
+            write_string(out, value[shared:])
+        previous = key
+
+
+def read_keys(data, pos):
+    keys = []
+    previous = ('', '')
+    count, pos = read_varint(data, pos)
+    for _ in range(count):
+        key = []
+        for before in previous:
+            shared, pos = read_varint(data, pos)
+            rest, pos = read_string(data, pos)
+            key.append(before[:shared] + rest)
+        previous = tuple(key)
+        keys.append(previous)
+    return keys, pos
+
+
+def count_value(value):
+    # A page without a Seats or Waitlist row leaves its counts blank
+    return None if value == '' else int(value)
+
+
+def seat_key_values(row):
+    # ((term, crn), counts) of a seat row, a dict or a sequence in SEAT_FIELDS
+    # order. Raises ValueError for a count that is neither blank nor a number.
+    if isinstance(row, dict):
+        return (str(row['term']), str(row['crn'])), tuple(count_value(row[field]) for field in COUNT_FIELDS)
+    return (str(row[0]), str(row[1])), tuple(count_value(value) for value in row[2:])
+
+
+def seat_row(key, counts):
+    # The seat row, as a dict keyed by SEAT_FIELDS, of a key and its counts
+    return dict(zip(SEAT_FIELDS, key + tuple('' if count is None else count for count in counts)))
+
+
+def count_entry(key_id, old, new):
+    # The (key id, mask, blanks, deltas) entry of a row going from counts old to new
+    mask, blanks, deltas = PRESENT, 0, []
+    for i, (old_count, count) in enumerate(zip(old, new)):
+        if count == old_count:
+            continue
+        mask |= 1 << i
+        if count is None:
+            blanks |= 1 << i
+        else:
+            deltas.append(count - (old_count or 0))
+    return key_id, mask | BLANKS if blanks else mask, blanks, deltas
+
+
+def encode_body(kind, timestamp, new_keys, entries):
+    body = bytearray(kind)
+    write_varint(body, timestamp)
+    write_keys(body, new_keys)
+    write_varint(body, len(entries))
+    previous_id = 0
+    for key_id, mask, blanks, deltas in entries:
+        write_varint(body, key_id - previous_id)
+        previous_id = key_id
+        body.append(mask)
+        if mask & BLANKS:
+            body.append(blanks)
+        for delta in deltas:
+            write_varint(body, zigzag(delta))
+    return body
+
+
+def apply_record(body, state, table):
+    # Applies one record body to state ((term, crn) -> counts) and table (key ids)
+    if body[:1] == KEYFRAME:
+        state.clear()
+        table.clear()
+    _, pos = read_varint(body, 1)
+    new_keys, pos = read_keys(body, pos)
+    table.extend(new_keys)
+    entries, pos = read_varint(body, pos)
+    key_id = 0
+    for _ in range(entries):
+        gap, pos = read_varint(body, pos)
+        key_id += gap
+        mask = body[pos]
+        pos += 1
+        key = table[key_id]
+        if not mask:
+            state.pop(key, None)
+            continue
+        blanks = 0
+        if mask & BLANKS:
+            blanks = body[pos]
+            pos += 1
+        counts = list(state.get(key, (0,) * len(COUNT_FIELDS)))
+        for i in range(len(COUNT_FIELDS)):
+            if blanks >> i & 1:
+                counts[i] = None
+            elif mask >> i & 1:
+                delta, pos = read_varint(body, pos)
+                counts[i] = (counts[i] or 0) + unzigzag(delta)
+        state[key] = tuple(counts)
+
+
+class SeatHistory:
+    """Append-only history of seat capacity polls, stored as deltas.
+
+    append() records a poll as the rows whose counts changed since the
+    previous one, with zigzag varint deltas, and every
+    keyframe_interval polls as a full keyframe. state_at() rebuilds the
+    counts at any past time from the nearest keyframe before it. A record
+    cut short by a crash is dropped when the file is opened.
+    """
+
+    def __init__(self, path, keyframe_interval=KEYFRAME_INTERVAL):
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        self.snapshots = []  # (timestamp, offset, size, keyframe) per record
+        self._file = open(path, 'a+b')
+        self._scan()
+        # Counts and key ids as of the last record, which the next one is a delta of
+        self.state = {}
+        self._table = []
+        if self.snapshots:
+            self._replay(len(self.snapshots) - 1, self.state, self._table)
+        self._ids = {key: key_id for key_id, key in enumerate(self._table)}
+
+    def _scan(self):
+        # Reads only each record's header, skipping over its body
+        size = self._file.seek(0, os.SEEK_END)
+        offset = 0
+        while offset < size:
+            self._file.seek(offset)
+            header = self._file.read(HEADER_READ)
+            try:
+                length, pos = read_varint(header, 0)
+                timestamp, _ = read_varint(header, pos + 1)
+            except IndexError:
+                break
+            if offset + pos + length > size:
+                break
+            self.snapshots.append((timestamp, offset + pos, length, header[pos:pos + 1] == KEYFRAME))
+            offset += pos + length
+        if offset < size:
+            self._file.truncate(offset)
+
+    def _read_body(self, index):
+        _, offset, size, _ = self.snapshots[index]
+        self._file.seek(offset)
+        return self._file.read(size)
+
+    def _replay(self, index, state, table):
+        start = index
+        while not self.snapshots[start][3]:
+            start -= 1
+        for i in range(start, index + 1):
+            apply_record(self._read_body(i), state, table)
+
+    def _since_keyframe(self):
+        count = 0
+        for snapshot in reversed(self.snapshots):
+            if snapshot[3]:
+                return count
+            count += 1
+        return count
+
+    def append(self, rows, removed=(), timestamp=None):
+        # Records a poll: rows are seat rows as written to the CSV, removed
+        # the (term, crn) of sections that no longer have seat data. Rows
+        # not mentioned keep their counts. Returns the rows that changed.
+        timestamp = int(time.time()) if timestamp is None else int(timestamp)
+        changes = {}
+        for row in rows:
+            try:
+                key, counts = seat_key_values(row)
+            except ValueError as e:
+                term, crn = (row['term'], row['crn']) if isinstance(row, dict) else row[:2]
+                logger.warning("Seat counts of term %s CRN %s not recorded in the history: %s", term, crn, e)
+                continue
+            if self.state.get(key) != counts:
+                changes[key] = counts
+        removed = [key for key in set(removed) if key in self.state and key not in changes]
+        previous = dict(self.state)
+        self.state.update(changes)
+        for key in removed:
+            del self.state[key]
+
+        if not self.snapshots or self._since_keyframe() >= self.keyframe_interval:
+            self._table = sorted(self.state)
+            self._ids = {key: key_id for key_id, key in enumerate(self._table)}
+            new_keys = self._table
+            zeros = (0,) * len(COUNT_FIELDS)
+            entries = [count_entry(key_id, zeros, self.state[key]) for key_id, key in enumerate(self._table)]
+            kind = KEYFRAME
+        else:
+            new_keys = sorted(key for key in changes if key not in self._ids)
+            for key in new_keys:
+                self._ids[key] = len(self._table)
+                self._table.append(key)
+            zeros = (0,) * len(COUNT_FIELDS)
+            entries = [count_entry(self._ids[key], previous.get(key, zeros), counts) for key, counts in changes.items()]
+            entries.extend((self._ids[key], 0, 0, []) for key in removed)
+            entries.sort()
+            kind = DELTA
+
+        body = encode_body(kind, timestamp, new_keys, entries)
+        record = bytearray()
+        write_varint(record, len(body))
+        offset = self._file.seek(0, os.SEEK_END)
+        self._file.write(record + body)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.snapshots.append((timestamp, offset + len(record), len(body), kind == KEYFRAME))
+        return len(changes) + len(removed)
+
+    def state_at(self, timestamp):
+        # (term, crn) -> counts as of the last poll at or before timestamp
+        index = bisect_right([snapshot[0] for snapshot in self.snapshots], timestamp) - 1
+        state = {}
+        if index >= 0:
+            self._replay(index, state, [])
+        return state
+
+    def rows_at(self, timestamp):
+        # The seat rows of state_at(timestamp), as dicts keyed by SEAT_FIELDS
+        return [seat_row(key, counts) for key, counts in sorted(self.state_at(timestamp).items())]
+
+    def close(self):
+        self._file.close()
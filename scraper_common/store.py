@@ -0,0 +1,142 @@
+import sqlite3
+
+from scraper_common.records import SECTION_FIELDS, COURSE_FIELDS
+from scraper_common.banner import SEAT_FIELDS
+
+WRITE_BATCH_SIZE = 500  # rows upserted per transaction
+
+# Table name -> (CSV field names, key fields, integer fields). Columns are
+# the field names lowercased with spaces as underscores, so rows can be
+# written as the same dicts or sequences that go to the CSVs.
+TABLES = {
+    'sections': (SECTION_FIELDS, ('term', 'crn'), ()),
+    'seats': (SEAT_FIELDS, ('term', 'crn'), tuple(SEAT_FIELDS[2:])),
+    'courses': (COURSE_FIELDS, ('Course ID',), ()),
+}
+
+# Index name -> (table, fields); the keys above are indexed as well
+INDEXES = {
+    'sections_course': ('sections', ('term', 'subject', 'course_number')),
+    'sections_instructor': ('sections', ('instructor',)),
+    'courses_subject': ('courses', ('Subject Code',)),
+}
+
+
+def column_name(field):
+    return field.lower().replace(' ', '_')
+
+
+def sql_value(value):
+    # Anything SQLite cannot store, such as a list of requisites, is stored
+    # as the text the CSV writer would write for it
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    return str(value)
+
+
+def create_table_sql(table):
+    fields, key, integers = TABLES[table]
+    columns = [f"{column_name(field)} {'INTEGER' if field in integers else 'TEXT'}" for field in fields]
+    columns.append(f"PRIMARY KEY ({', '.join(map(column_name, key))})")
+    return f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(columns)})"
+
+
+def upsert_sql(table):
+    fields, key, _ = TABLES[table]
+    columns = [column_name(field) for field in fields]
+    key_columns = [column_name(field) for field in key]
+    updates = ', '.join(f"{column} = excluded.{column}" for column in columns if column not in key_columns)
+    return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET {updates}")
+
+
+class SqliteStore:
+    """Sections, seat counts and course details in one SQLite database.
+
+    The database is in WAL mode, so readers are not blocked while a
+    scraper writes. Rows are upserted on their key ((term, crn) for
+    sections and seats, Course ID for course details), so a rerun updates
+    rows in place. Sections are also indexed by course and by instructor.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        # In WAL mode this still survives a crash of the process, without
+        # an fsync on every commit
+        self.connection.execute('PRAGMA synchronous = NORMAL')
+        with self.connection:
+            for table in TABLES:
+                self.connection.execute(create_table_sql(table))
+            for name, (table, fields) in INDEXES.items():
+                self.connection.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} "
+                                        f"({', '.join(map(column_name, fields))})")
+
+    def writer(self, table, batch_size=WRITE_BATCH_SIZE):
+        return StoreWriter(self, table, batch_size)
+
+    def keys(self, table):
+        # Every key in table, read from its primary key index
+        key_columns = ', '.join(map(column_name, TABLES[table][1]))
+        return self.connection.execute(f"SELECT {key_columns} FROM {table}")
+
+    def rows(self, table, **where):
+        # Rows of table as dicts keyed by CSV field name, e.g.
+        # rows('sections', term='202501', subject='CSC', course_number='110')
+        # or rows('sections', instructor=...), which use the indexes
+        fields = TABLES[table][0]
+        columns = {column_name(field) for field in fields}
+        unknown = set(where) - columns
+        if unknown:
+            raise ValueError(f"{table} has no column {', '.join(sorted(unknown))}")
+        query = f"SELECT {', '.join(map(column_name, fields))} FROM {table}"
+        if where:
+            query += ' WHERE ' + ' AND '.join(f"{column} = ?" for column in where)
+        for row in self.connection.execute(query, tuple(where.values())):
+            yield dict(zip(fields, row))
+
+    def delete(self, table, keys):
+        key_columns = TABLES[table][1]
+        with self.connection:
+            self.connection.executemany(
+                f"DELETE FROM {table} WHERE " + ' AND '.join(f"{column_name(field)} = ?" for field in key_columns),
+                keys)
+
+    def close(self):
+        self.connection.close()
+
+
+class StoreWriter:
+    """Upserts rows into one table of a SqliteStore in batched transactions.
+
+    Takes the same rows as CsvStreamWriter, dicts keyed by field name or
+    sequences in field order, and has the same interface.
+    """
+
+    def __init__(self, store, table, batch_size=WRITE_BATCH_SIZE):
+        self.store = store
+        self.table = table
+        self.batch_size = batch_size
+        self.rows_written = 0
+        self._fields = TABLES[table][0]
+        self._sql = upsert_sql(table)
+        self._pending = []
+
+    def write(self, rows):
+        self._pending.extend(tuple(map(sql_value, (row.get(field, '') for field in self._fields)
+                                       if isinstance(row, dict) else row))
+                             for row in rows)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        with self.store.connection:
+            self.store.connection.executemany(self._sql, self._pending)
+        self.rows_written += len(self._pending)
+        self._pending = []
+
+    def close(self):
+        self.flush()
@@ -0,0 +1,51 @@
+import datetime
+import json
+import os
+
+# Catalog list fields that change whenever a course's details do
+SYNC_FIELDS = ('id', 'pid', 'dateStart', 'catalogActivationDate')
+
+
+class SyncState:
+    """Last-seen catalog metadata per __catalogCourseId, for incremental syncs.
+
+    Stored as one JSON object keyed by course ID. A course that disappears
+    from the catalog is kept as a tombstone ("removed" set to the date it
+    went missing), so it is fetched again as new if it ever comes back.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def is_current(self, course):
+        # True when the course was fetched before and its metadata is unchanged
+        entry = self.entries.get(course.get('__catalogCourseId', ''))
+        if not entry or entry.get('removed'):
+            return False
+        return all(entry.get(field) == course.get(field) for field in SYNC_FIELDS)
+
+    def update(self, course):
+        self.entries[course.get('__catalogCourseId', '')] = {field: course.get(field) for field in SYNC_FIELDS}
+
+    def remove_missing(self, seen):
+        # Tombstones every live entry whose course ID is not in seen
+        today = datetime.date.today().isoformat()
+        removed = []
+        for course_id, entry in self.entries.items():
+            if course_id not in seen and not entry.get('removed'):
+                entry['removed'] = today
+                removed.append(course_id)
+        return removed
+
+    def save(self):
+        # Written beside the old state and swapped in, so a crash keeps one or the other
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=1, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
@@ -0,0 +1,84 @@
+import re
+
+from bs4 import BeautifulSoup
+from bs4.dammit import EntitySubstitution
+
+# Everything the fast path understands, plus anything that makes it hand the
+# fragment to BeautifulSoup instead: raw-text elements, declarations, CDATA,
+# processing instructions, bare '<' or '&', and references html.parser
+# treats specially. The lookahead lets the scan skip plain text quickly.
+TOKEN_REGEX = re.compile(r'''
+  (?=[<&\x00]) (?:
+    (?P<sep>\x00)
+  | (?P<comment><!--[^\x00]*?-->)
+  | (?P<raw><(?:script|style|template|textarea|title|xmp|noscript|plaintext|iframe|noembed|noframes)\b)
+  | (?P<tag></?[a-zA-Z][^\s/>\x00]*(?:[^<>"'\x00]|"[^"<>\x00]*"|'[^'<>\x00]*')*>)
+  | &(?:\#(?P<dec>[0-9]{1,7})|\#[xX](?P<hex>[0-9a-fA-F]{1,6})|(?P<name>[a-zA-Z][a-zA-Z0-9]*));
+  | (?P<odd>[<&])
+  )
+''', re.DOTALL | re.IGNORECASE | re.VERBOSE)
+
+ENTITIES = EntitySubstitution.HTML_ENTITY_TO_CHARACTER
+
+def _character(match):
+    # Text for a well-formed reference, or None where html.parser and
+    # BeautifulSoup apply replacement rules (NUL, C1 controls, surrogates)
+    if match.group('name'):
+        name = match.group('name')
+        return ENTITIES.get(name, '&' + name)
+    value = int(match.group('dec')) if match.group('dec') else int(match.group('hex'), 16)
+    if 0 < value < 0x80 or (0x9f < value <= 0x10ffff and not 0xd800 <= value <= 0xdfff):
+        return chr(value)
+    return None
+
+def html_fragments_to_text(fragments):
+    """Text of each HTML fragment, as get_text(separator=' ', strip=True).
+
+    All fragments are scanned in one pass over their joined text without
+    building a tree. A fragment using markup the scanner does not model is
+    converted by BeautifulSoup instead, so the output is always identical.
+    """
+    if not fragments:
+        return []
+    texts = [[]]
+    fallback = set()
+    pieces = []
+    joined = '\x00'.join(fragments)
+    if '\x00' in joined and joined.count('\x00') != len(fragments) - 1:
+        # NUL inside a fragment would be mistaken for a boundary
+        return [BeautifulSoup(fragment, 'html.parser').get_text(separator=' ', strip=True)
+                for fragment in fragments]
+
+    position = 0
+    for match in TOKEN_REGEX.finditer(joined):
+        kind = match.lastgroup
+        if kind in ('dec', 'hex', 'name'):
+            character = _character(match)
+            if character is None:
+                fallback.add(len(texts) - 1)
+            else:
+                pieces.append(joined[position:match.start()])
+                pieces.append(character)
+                position = match.end()
+            continue
+        if kind in ('raw', 'odd'):
+            fallback.add(len(texts) - 1)
+            continue
+        # A tag, comment or fragment boundary ends the current string
+        pieces.append(joined[position:match.start()])
+        string = ''.join(pieces).strip()
+        if string:
+            texts[-1].append(string)
+        pieces = []
+        position = match.end()
+        if kind == 'sep':
+            texts.append([])
+    pieces.append(joined[position:])
+    string = ''.join(pieces).strip()
+    if string:
+        texts[-1].append(string)
+
+    results = [' '.join(strings) for strings in texts]
+    for index in fallback:
+        results[index] = BeautifulSoup(fragments[index], 'html.parser').get_text(separator=' ', strip=True)
+    return results
@@ -0,0 +1,130 @@
+import contextlib
+import contextvars
+import json
+import time
+
+import aiohttp
+
+from scraper_common.metrics import METRICS, LATENCY_BUCKETS
+
+# Where the time of one scraped page goes, in the order it is spent.
+# queue_wait is waiting for a limiter slot or a pooled connection, ttfb runs
+# from the request being sent to its response headers, and retry_wait is
+# backoff between attempts.
+STAGES = ('queue_wait', 'connect', 'ttfb', 'body', 'retry_wait', 'parse', 'write')
+
+STAGE_SECONDS = METRICS.histogram('scraper_stage_seconds', "Time spent in each stage of scraping a page",
+                                  LATENCY_BUCKETS, ['stage'])
+
+_current = contextvars.ContextVar('request_spans', default=None)
+_trace_file = None
+
+
+class RequestSpans:
+    """Seconds spent per stage while scraping one page, summed over retries."""
+
+    __slots__ = ('label', 'start', 'stages')
+
+    def __init__(self, label):
+        self.label = label
+        self.start = time.perf_counter()
+        self.stages = {}
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def as_dict(self):
+        return {
+            'label': self.label,
+            'seconds': time.perf_counter() - self.start,
+            'stages': {stage: self.stages[stage] for stage in STAGES if stage in self.stages},
+        }
+
+
+def record_stage(stage, seconds):
+    # Adds to the run's totals and to the page being scraped by this task
+    STAGE_SECONDS.observe(seconds, stage)
+    spans = _current.get()
+    if spans is not None:
+        spans.add(stage, seconds)
+
+
+@contextlib.contextmanager
+def timed_stage(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+@contextlib.contextmanager
+def request_spans(label):
+    # Stages recorded by this task until the block exits belong to label's
+    # page. Tasks started inside the block inherit it until they open their own.
+    spans = RequestSpans(label)
+    token = _current.set(spans)
+    try:
+        yield spans
+    finally:
+        _current.reset(token)
+        if _trace_file is not None:
+            _trace_file.write(json.dumps(spans.as_dict()) + '\n')
+
+
+def start_trace(path):
+    # Every finished page is appended to path as one JSON line
+    global _trace_file
+    _trace_file = open(path, 'w', encoding='utf-8')
+
+
+def stop_trace():
+    global _trace_file
+    if _trace_file is not None:
+        _trace_file.close()
+        _trace_file = None
+
+
+def trace_config():
+    # aiohttp hooks that split a request into pool wait, connect and ttfb;
+    # fetch_cached times the body itself
+    config = aiohttp.TraceConfig()
+
+    async def on_request_start(session, context, params):
+        context.ready = time.perf_counter()
+
+    async def on_connection_queued_start(session, context, params):
+        context.queued = time.perf_counter()
+
+    async def on_connection_queued_end(session, context, params):
+        context.ready = time.perf_counter()
+        record_stage('queue_wait', context.ready - context.queued)
+
+    async def on_connection_create_start(session, context, params):
+        context.connecting = time.perf_counter()
+
+    async def on_connection_create_end(session, context, params):
+        context.ready = time.perf_counter()
+        record_stage('connect', context.ready - context.connecting)
+
+    async def on_request_end(session, context, params):
+        record_stage('ttfb', time.perf_counter() - context.ready)
+
+    config.on_request_start.append(on_request_start)
+    config.on_connection_queued_start.append(on_connection_queued_start)
+    config.on_connection_queued_end.append(on_connection_queued_end)
+    config.on_connection_create_start.append(on_connection_create_start)
+    config.on_connection_create_end.append(on_connection_create_end)
+    config.on_request_end.append(on_request_end)
+    return config
+
+
+def stage_summary():
+    # One line with the run's total and mean seconds per stage
+    parts = []
+    for stage in STAGES:
+        state = STAGE_SECONDS.values.get((stage,))
+        if state:
+            _, total, count = state
+            parts.append(f"{stage} {total:.2f}s ({total / count * 1000:.1f} ms x {count})")
+    return "Stage time: " + (', '.join(parts) if parts else 'nothing recorded') + "."
@@ -1,145 +1,353 @@
 import asyncio
 import aiohttp
 import csv
-from bs4 import BeautifulSoup
+import logging
 import time
+import argparse
+import os
+import sys
 
-# Maximum number of concurrent requests
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from scraper_common.http_cache import ResponseCache, DEFAULT_CACHE_DIR, fetch_cached
+from scraper_common.concurrency import AdaptiveLimiter, DEFAULT_MAX_CONCURRENCY
+from scraper_common.retry import RetryScheduler
+from scraper_common.journal import Journal
+from scraper_common.columnar import ParquetStreamWriter, SEAT_COLUMNS
+from scraper_common.store import SqliteStore
+from scraper_common.seat_history import SeatHistory, seat_key_values, seat_row
+from scraper_common.polling import PollScheduler, RequestBudget, DEFAULT_BUDGET, MIN_INTERVAL, MAX_INTERVAL
+from scraper_common.banner import SEAT_FIELDS, SEAT_PARSERS, DEFAULT_PARSER, parse_details_row
+from scraper_common.parsing import ParseStage, DEFAULT_PARSE_WORKERS
+from scraper_common.metrics import METRICS, serve_metrics
+from scraper_common.log import setup_logging
+from scraper_common.tracing import request_spans, trace_config, start_trace, stop_trace, stage_summary, timed_stage
+
+logger = logging.getLogger(__name__)
+
+# Starting number of concurrent requests, adjusted at runtime by the limiter
 CONCURRENT_REQUESTS = 10
 
-async def fetch_details(session, sem, term, crn):
-    url = f"https://www.uvic.ca/BAN1P/bwckschd.p_disp_detail_sched?term_in={term}&crn_in={crn}"
+# Overridden with --base-url to scrape a stand-in server instead
+BASE_URL = "https://www.uvic.ca/BAN1P"
+
+FLUSH_INTERVAL = 60  # seconds between history appends and CSV rewrites in --watch mode
+
+async def fetch_details(session, limiter, retry, term, crn, cache=None, base_url=BASE_URL, budget=None):
+    url = f"{base_url}/bwckschd.p_disp_detail_sched?term_in={term}&crn_in={crn}"
     headers = {
         'User-Agent': 'Mozilla/5.0'  # Generic User-Agent
     }
-    async with sem:
-        for attempt in range(3):  # Retry up to 3 times
-            try:
-                print(f"Fetching details for term {term} CRN {crn} (attempt {attempt + 1})...", flush=True)
-                async with session.get(url, headers=headers, timeout=10) as response:
-                    response.raise_for_status()  # Raise exception for HTTP errors
-                    html_content = await response.text()
-                    print(f"Successfully fetched details for term {term} CRN {crn}.", flush=True)
-                    return html_content
-            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-                wait_time = 2 ** attempt
-                print(f"Attempt {attempt + 1} failed for term {term} CRN {crn}: {e}. Retrying in {wait_time} seconds...", flush=True)
-                await asyncio.sleep(wait_time)
-        print(f"Failed to fetch details for term {term} CRN {crn} after 3 attempts.", flush=True)
-        return None
-
-def parse_details_html(html_content, term, crn):
-    soup = BeautifulSoup(html_content, 'html.parser')
-
-    course_info = {
-        'term': term,
-        'crn': crn,
-        'Seats_Capacity': '',
-        'Seats_Actual': '',
-        'Seats_Remaining': '',
-        'Waitlist_Capacity': '',
-        'Waitlist_Actual': '',
-        'Waitlist_Remaining': ''
-    }
+    logger.debug("Fetching details for term %s CRN %s...", term, crn)
+    # Each attempt takes a limiter slot only while its request is in flight;
+    # backoff between attempts happens in the retry scheduler without one.
+    # With a request budget every attempt, retries too, spends from it.
+    async def attempt():
+        if budget:
+            await budget.acquire()
+        return await fetch_cached(session, cache, url, headers=headers, timeout=10, limiter=limiter)
 
-    # Find the table with caption "Registration Availability"
-    tables = soup.find_all('table', class_='datadisplaytable')
-    reg_table = None
-    for table in tables:
-        caption = table.find('caption', class_='captiontext')
-        if caption and 'Registration Availability' in caption.text:
-            reg_table = table
-            break
-
-    if reg_table is None:
-        print(f"No 'Registration Availability' table found for term {term}, CRN {crn}.", flush=True)
-        return None
-
-    # Now parse the rows in reg_table
-    rows = reg_table.find_all('tr')
-    data_rows = rows[1:]  # Skip the header row
-
-    for row in data_rows:
-        headers = row.find_all('th')
-        cells = row.find_all('td')
-        if headers and len(headers) >= 1 and len(cells) >= 3:
-            label = headers[0].get_text(strip=True)
-            capacity = cells[0].get_text(strip=True)
-            actual = cells[1].get_text(strip=True)
-            remaining = cells[2].get_text(strip=True)
-            if label == 'Seats':
-                course_info['Seats_Capacity'] = capacity
-                course_info['Seats_Actual'] = actual
-                course_info['Seats_Remaining'] = remaining
-            elif label == 'Waitlist Seats':
-                course_info['Waitlist_Capacity'] = capacity
-                course_info['Waitlist_Actual'] = actual
-                course_info['Waitlist_Remaining'] = remaining
-
-    return course_info
+    html_content = await retry.run(url, attempt, f"details for term {term} CRN {crn}")
+    if html_content is not None:
+        logger.debug("Successfully fetched details for term %s CRN %s.", term, crn)
+    return html_content
 
 def save_details_to_csv(courses, filename):
-    fieldnames = [
-        'term', 'crn', 'Seats_Capacity', 'Seats_Actual', 'Seats_Remaining',
-        'Waitlist_Capacity', 'Waitlist_Actual', 'Waitlist_Remaining'
-    ]
-    
     with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer = csv.DictWriter(csvfile, fieldnames=SEAT_FIELDS)
         writer.writeheader()
         for course in courses:
             writer.writerow(course)
-    print(f"Data has been saved to {filename}.", flush=True)
+    logger.info("Data has been saved to %s.", filename)
 
-async def fetch_and_parse_details(session, sem, term, crn):
-    html_content = await fetch_details(session, sem, term, crn)
-    if html_content:
-        course_info = parse_details_html(html_content, term, crn)
-        return course_info
-    else:
-        return None
+def read_section_keys(filename):
+    # (term, crn) of every row of a scraped sections CSV
+    with open(filename, 'r', encoding='utf-8') as csvfile:
+        for row in csv.DictReader(csvfile):
+            yield row['term'], row['crn']
+
+def save_details_to_parquet(courses, filename):
+    writer = ParquetStreamWriter(filename, SEAT_COLUMNS)
+    writer.write(courses)
+    writer.close()
+    logger.info("Data has been saved to %s.", filename)
+
+def section_keys(store, sections_path):
+    # The term and crn pairs of the scraped sections. Without a sections
+    # CSV they come from the store's (term, crn) index.
+    if store and sections_path is None:
+        return store.keys('sections')
+    return read_section_keys(sections_path or 'scraped_course_data.csv')
+
+async def fetch_and_parse_details(session, limiter, retry, parse_stage, term, crn, cache=None, base_url=BASE_URL,
+                                  budget=None):
+    # Returns (term, crn, rows); rows is None when the page could not be fetched
+    with request_spans(f"term {term} CRN {crn}"):
+        html_content = await fetch_details(session, limiter, retry, term, crn, cache, base_url, budget)
+        if html_content is None:
+            return term, crn, None
+        row = await parse_stage.run(parse_details_row, html_content, term, crn, parse_stage.backend)
+        return term, crn, [dict(zip(SEAT_FIELDS, row))] if row else []
 
-async def main():
+async def main(cache=None, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+               journal_path='course_capacity_data.journal', resume=False,
+               parse_workers=DEFAULT_PARSE_WORKERS, parser_backend=DEFAULT_PARSER,
+               base_url=BASE_URL, sections_path=None, output='course_capacity_data.csv',
+               metrics_port=None, trace_path=None, profile_path=None, parquet_path=None,
+               sqlite_path=None, history_path=None):
     start_time = time.time()
-    print("Script started.", flush=True)
-    all_courses = []
+    if trace_path:
+        start_trace(trace_path)
+    logger.info("Script started.")
+    metrics_server = await serve_metrics(METRICS, metrics_port) if metrics_port else None
+    if metrics_server:
+        logger.info("Serving metrics on http://127.0.0.1:%d/metrics", metrics_port)
+    # The journal records finished CRNs so --resume can skip them
+    journal = Journal(journal_path, resume=resume)
+    all_courses = list(journal.replay())
+    if journal.done:
+        logger.info("Resuming: %d CRNs already scraped.", len(journal.done))
     
-    # Read 'scraped_course_data.csv' and get unique term and crn pairs
-    terms_crns = set()
-    with open('scraped_course_data.csv', 'r', encoding='utf-8') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            term = row['term']
-            crn = row['crn']
-            terms_crns.add((term, crn))
+    store = SqliteStore(sqlite_path) if sqlite_path else None
+    # Seat counts are upserted on (term, crn) as they arrive
+    seats = store.writer('seats') if store else None
+
+    # Get the unique term and crn pairs of the scraped sections
+    terms_crns = {key for key in section_keys(store, sections_path) if key not in journal.done}
+    # CRNs whose page had no seat data, which the history records as removed
+    no_seats = []
     
-    sem = asyncio.Semaphore(CONCURRENT_REQUESTS)
+    limiter = AdaptiveLimiter(CONCURRENT_REQUESTS, maximum=max_concurrency)
+    retry = RetryScheduler()
+    # Pages are parsed in worker processes so the loop keeps reading responses
+    parse_stage = ParseStage(parse_workers, backend=parser_backend, profile_path=profile_path)
     
-    async with aiohttp.ClientSession() as session:
+    # The trace hooks split each request into pool wait, connect and time to first byte
+    async with aiohttp.ClientSession(trace_configs=[trace_config()]) as session:
         tasks = []
         for term, crn in terms_crns:
             tasks.append(
-                fetch_and_parse_details(session, sem, term, crn)
+                fetch_and_parse_details(session, limiter, retry, parse_stage, term, crn, cache, base_url)
             )
         
         # Process tasks concurrently with progress indication
         total_tasks = len(tasks)
         completed_tasks = 0
-        for future in asyncio.as_completed(tasks):
-            course_info = await future
-            completed_tasks += 1
-            print(f"Completed {completed_tasks}/{total_tasks} tasks.", flush=True)
-            if course_info:
-                all_courses.append(course_info)
+        try:
+            for future in asyncio.as_completed(tasks):
+                term, crn, rows = await future
+                completed_tasks += 1
+                logger.debug("Completed %d/%d tasks.", completed_tasks, total_tasks)
+                if rows == []:
+                    no_seats.append((term, crn))
+                if rows is not None:
+                    with timed_stage('write'):
+                        journal.record((term, crn), rows)
+                        if seats:
+                            seats.write(rows)
+                    all_courses.extend(rows)
+        finally:
+            journal.close()
+            if store:
+                seats.close()
+                store.close()
+            parse_stage.close()
+            stop_trace()
+            if metrics_server:
+                await metrics_server.cleanup()
     
     # Save all the scraped data to a new CSV file
-    save_details_to_csv(all_courses, 'course_capacity_data.csv')
+    with timed_stage('write'):
+        save_details_to_csv(all_courses, output)
+        if parquet_path:
+            save_details_to_parquet(all_courses, parquet_path)
+        if history_path:
+            # Only the rows that changed since the last poll are appended
+            history = SeatHistory(history_path)
+            changed = history.append(all_courses, no_seats, timestamp=start_time)
+            history.close()
+            logger.info("%d of %d CRNs changed since the last poll, appended to %s.",
+                        changed, len(all_courses), history_path)
+    logger.info(limiter.summary())
+    logger.info(retry.summary())
+    logger.info(stage_summary())
+    if cache:
+        logger.info(cache.summary())
+        cache.close()
     end_time = time.time()
     total_time = end_time - start_time
     hours, rem = divmod(total_time, 3600)
     minutes, seconds = divmod(rem, 60)
-    print("Script execution time: {:0>2}:{:0>2}:{:05.2f}".format(int(hours), int(minutes), seconds), flush=True)
-    print("Script finished.", flush=True)
+    logger.info("Script execution time: {:0>2}:{:0>2}:{:05.2f}".format(int(hours), int(minutes), seconds))
+    logger.info("Script finished.")
+
+async def watch(max_concurrency=DEFAULT_MAX_CONCURRENCY, parse_workers=DEFAULT_PARSE_WORKERS,
+                parser_backend=DEFAULT_PARSER, base_url=BASE_URL, sections_path=None,
+                output='course_capacity_data.csv', metrics_port=None, trace_path=None, profile_path=None,
+                sqlite_path=None, history_path=None, budget=DEFAULT_BUDGET, min_interval=MIN_INTERVAL,
+                max_interval=MAX_INTERVAL, duration=None):
+    # Polls CRNs until interrupted (or for duration seconds), each when the
+    # scheduler says it is due and within the request budget. Every
+    # FLUSH_INTERVAL the polls since the last flush are appended to the
+    # history and the CSV is rewritten with the latest counts of every CRN.
+    if trace_path:
+        start_trace(trace_path)
+    metrics_server = await serve_metrics(METRICS, metrics_port) if metrics_port else None
+    if metrics_server:
+        logger.info("Serving metrics on http://127.0.0.1:%d/metrics", metrics_port)
+    store = SqliteStore(sqlite_path) if sqlite_path else None
+    seats = store.writer('seats') if store else None
+    history = SeatHistory(history_path) if history_path else None
+
+    # CRNs with counts in the history start on their usual schedule
+    scheduler = PollScheduler(min_interval, max_interval)
+    for key in sorted(set(section_keys(store, sections_path))):
+        scheduler.add(key, history.state.get(key) if history else None)
+    logger.info("Watching %d CRNs with a budget of %d requests per minute.", len(scheduler.change_rates), budget)
+    request_budget = RequestBudget(budget)
+    limiter = AdaptiveLimiter(CONCURRENT_REQUESTS, maximum=max_concurrency)
+    retry = RetryScheduler()
+    parse_stage = ParseStage(parse_workers, backend=parser_backend, profile_path=profile_path)
+    polled = []
+    no_seats = []
+
+    def flush():
+        with timed_stage('write'):
+            changed = history.append(polled, no_seats) if history else None
+            if seats:
+                seats.flush()
+            latest = sorted(scheduler.counts.items())
+            save_details_to_csv([seat_row(key, counts) for key, counts in latest], output)
+        logger.info("%d polls%s, %d CRNs overdue. %s", len(polled) + len(no_seats),
+                    f", {changed} changed" if history else '', scheduler.overdue(), scheduler.summary())
+        polled.clear()
+        no_seats.clear()
+
+    async def flush_periodically():
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            flush()
+
+    async with aiohttp.ClientSession(trace_configs=[trace_config()]) as session:
+        async def poll(key):
+            # Always fetched fresh; a cached page would defeat the schedule.
+            # Whatever goes wrong, the CRN is rescheduled like a failed fetch.
+            term, crn = key
+            try:
+                _, _, rows = await fetch_and_parse_details(session, limiter, retry, parse_stage, term, crn,
+                                                           None, base_url, request_budget)
+                counts = seat_key_values(rows[0])[1] if rows else None
+            except Exception as e:
+                logger.warning("Polling term %s CRN %s failed: %s", term, crn, e)
+                rows = None
+            if rows == []:
+                # The section is gone; it is not polled again
+                scheduler.remove(key)
+                no_seats.append(key)
+            elif rows is None:
+                scheduler.record(key, None)
+            else:
+                changed = scheduler.record(key, counts)
+                polled.extend(rows)
+                if seats:
+                    seats.write(rows)
+                logger.debug("Polled term %s CRN %s: %s, next in %.0fs.", term, crn,
+                             'changed' if changed else 'unchanged', scheduler.intervals[key])
+
+        # At most max_concurrency polls in flight; the budget spaces their requests
+        slots = asyncio.Semaphore(max_concurrency)
+        tasks = set()
+
+        async def poll_due():
+            while True:
+                await slots.acquire()
+                task = asyncio.create_task(poll(await scheduler.next_due()))
+                tasks.add(task)
+                task.add_done_callback(lambda task: (tasks.discard(task), slots.release()))
+
+        flusher = asyncio.create_task(flush_periodically())
+        try:
+            await asyncio.wait_for(poll_due(), duration)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            flusher.cancel()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(flusher, *tasks, return_exceptions=True)
+            flush()
+            if history:
+                history.close()
+            if store:
+                seats.close()
+                store.close()
+            parse_stage.close()
+            stop_trace()
+            if metrics_server:
+                await metrics_server.cleanup()
+    logger.info(limiter.summary())
+    logger.info(retry.summary())
+    logger.info(stage_summary())
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Scrape seat capacity and waitlist data for scraped CRNs.")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="on-disk HTTP response cache shared by all scrapers")
+    parser.add_argument('--no-cache', action='store_true', help="always fetch full pages from the network")
+    parser.add_argument('--max-concurrency', type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help="upper bound for the adaptive number of in-flight requests")
+    parser.add_argument('--journal', default='course_capacity_data.journal',
+                        help="append-only log of finished CRNs used by --resume")
+    parser.add_argument('--resume', action='store_true',
+                        help="skip CRNs recorded in the journal and merge their rows into the output")
+    parser.add_argument('--parse-workers', type=int, default=DEFAULT_PARSE_WORKERS,
+                        help="processes used to parse pages (0 parses on the event loop)")
+    parser.add_argument('--parser', choices=sorted(SEAT_PARSERS), default=DEFAULT_PARSER,
+                        help="HTML parser backend (bs4 is the reference implementation)")
+    parser.add_argument('--base-url', default=BASE_URL,
+                        help="BAN1P root to scrape, e.g. a local stand-in server's http://127.0.0.1:8080/BAN1P")
+    parser.add_argument('--sections', help="scraped sections CSV to read CRNs from (default: the sections in "
+                                           "--sqlite if given, otherwise scraped_course_data.csv)")
+    parser.add_argument('--output', default='course_capacity_data.csv', help="CSV the seat data is written to")
+    parser.add_argument('--parquet', help="also write the seat counts to this Parquet file (needs pyarrow)")
+    parser.add_argument('--sqlite', help="also upsert the seat counts into this SQLite database")
+    parser.add_argument('--history', help="append this poll's changes to a delta-encoded seat history file, "
+                                          "read back with seat-history.py")
+    parser.add_argument('--watch', action='store_true',
+                        help="keep polling, each CRN as often as its fill, waitlist and recent changes call for")
+    parser.add_argument('--budget', type=int, default=DEFAULT_BUDGET,
+                        help="requests per minute --watch may make, retries included")
+    parser.add_argument('--min-interval', type=float, default=MIN_INTERVAL,
+                        help="seconds between polls of the busiest CRNs in --watch mode")
+    parser.add_argument('--max-interval', type=float, default=MAX_INTERVAL,
+                        help="seconds between polls of empty sections that are not changing in --watch mode")
+    parser.add_argument('--duration', type=float, help="stop --watch after this many minutes")
+    parser.add_argument('-v', '--verbose', action='count', default=0, help="log every request and finished CRN")
+    parser.add_argument('-q', '--quiet', action='store_true', help="only log warnings and errors")
+    parser.add_argument('--metrics', help="write request, retry and parse metrics here at the end "
+                                          "(JSON for a .json file, Prometheus text otherwise)")
+    parser.add_argument('--metrics-port', type=int, help="serve live metrics on http://127.0.0.1:PORT/metrics")
+    parser.add_argument('--trace', help="write each CRN's time per stage (queue wait, connect, ttfb, body, "
+                                        "parse) to this file as JSON lines")
+    parser.add_argument('--profile', help="sample the parse workers and write a speedscope profile "
+                                          "(or folded stacks for a .folded file)")
+    args = parser.parse_args()
+    if args.parquet and not ParquetStreamWriter.available:
+        parser.error("--parquet needs pyarrow: pip install pyarrow")
+    if args.watch and (args.resume or args.parquet):
+        parser.error("--watch does not support --resume or --parquet")
+    setup_logging(-1 if args.quiet else args.verbose)
+    if args.watch:
+        try:
+            asyncio.run(watch(args.max_concurrency, args.parse_workers, args.parser, args.base_url.rstrip('/'),
+                              args.sections, args.output, args.metrics_port, args.trace, args.profile,
+                              args.sqlite, args.history, args.budget, args.min_interval, args.max_interval,
+                              args.duration * 60 if args.duration else None))
+        except KeyboardInterrupt:
+            pass
+    else:
+        cache = None if args.no_cache else ResponseCache(args.cache_dir)
+        asyncio.run(main(cache, args.max_concurrency, args.journal, args.resume,
+                         args.parse_workers, args.parser, args.base_url.rstrip('/'), args.sections, args.output,
+                         args.metrics_port, args.trace, args.profile, args.parquet, args.sqlite,
+                         args.history))
+    if args.metrics:
+        METRICS.write(args.metrics)
\ No newline at end of file
@@ -0,0 +1,55 @@
+import argparse
+import csv
+import datetime
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from scraper_common.banner import SEAT_FIELDS
+from scraper_common.seat_history import SeatHistory
+
+# Reads back a seat history written by scraper-capacity.py --history: lists
+# its polls, or writes the seat counts as of any time as a capacity CSV.
+
+
+def parse_time(value):
+    # Unix seconds or an ISO 8601 date and time, local time unless it has an offset
+    try:
+        return int(value)
+    except ValueError:
+        return int(datetime.datetime.fromisoformat(value).timestamp())
+
+
+def format_time(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp).isoformat(sep=' ')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Read seat counts back from a seat history file.")
+    parser.add_argument('history', help="history file written by scraper-capacity.py --history")
+    parser.add_argument('--list', action='store_true', help="list the polls in the history and their sizes")
+    parser.add_argument('--at', type=parse_time,
+                        help="time to reconstruct, e.g. 2025-01-06T08:30 or Unix seconds (default: the last poll)")
+    parser.add_argument('--output', help="CSV to write the seat counts to (default: standard output)")
+    args = parser.parse_args()
+    if not os.path.exists(args.history):
+        parser.error(f"{args.history} does not exist")
+
+    history = SeatHistory(args.history)
+    if args.list:
+        for timestamp, _, size, keyframe in history.snapshots:
+            print(f"{format_time(timestamp)}  {'keyframe' if keyframe else 'delta   '}  {size} bytes")
+    else:
+        at = args.at if args.at is not None else max((snapshot[0] for snapshot in history.snapshots), default=0)
+        rows = history.rows_at(at)
+        if args.output:
+            with open(args.output, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=SEAT_FIELDS)
+                writer.writeheader()
+                writer.writerows(rows)
+            print(f"{len(rows)} CRNs as of {format_time(at)} saved to {args.output}.")
+        else:
+            writer = csv.DictWriter(sys.stdout, fieldnames=SEAT_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+    history.close()